@@ -0,0 +1,54 @@
+"""Measures how long it takes to build the DOT source of the issue graph with DotWriter and with graphviz.Digraph, which
+build_issue_graph used before, on a synthetic group with many issues and links.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m benchmarks.bench_dot [--issues 50000]
+"""
+import argparse
+
+import graphviz
+
+import src.render as render
+from benchmarks.bench_layout import best_of
+from mock.generator import generate_group
+from model.classes import Link_Type
+
+
+class Digraph(graphviz.Digraph):
+    """graphviz.Digraph, usable in a with statement like DotWriter"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def source_with(writer, data) -> str:
+    render.DotWriter = writer
+    return render.build_issue_graph(*data).source
+
+
+def main(count: int, repeat: int):
+    group = generate_group(count, epic_count=max(count // 20, 10))
+    list_related = [link for link in group.links if link.type == Link_Type.RELATES_TO]
+    list_blocks = [link for link in group.links if link.type == Link_Type.BLOCKS]
+    data = (group.issues, group.epics, list_related, list_blocks)
+    print(f"** {len(group.issues)} issues, {len(group.epics)} epics, {len(group.links)} links **")
+
+    dot_writer = render.DotWriter
+    try:
+        digraph, digraph_time = best_of(repeat, source_with, Digraph, data)
+        render.label_text.cache_clear()
+        written, writer_time = best_of(repeat, source_with, dot_writer, data)
+    finally:
+        render.DotWriter = dot_writer
+    print(f"graphviz.Digraph {digraph_time * 1000:8.1f}ms  {len(digraph) / 1e6:6.2f}MB")
+    print(f"DotWriter        {writer_time * 1000:8.1f}ms  {len(written) / 1e6:6.2f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--issues', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.issues, args.repeat)
@@ -0,0 +1,74 @@
+"""Measures the download from a local FixtureServer that answers with a latency and rate limits like Gitlab.
+
+The group is generated with mock.generator or read from a fixture recorded with mock.server --record. Every backend
+downloads it once, the time, the requests by endpoint and the rejected requests are printed, and the parsed issues,
+epics and links are checked against the ones of the first backend.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m benchmarks.bench_download [--issues 1000] [--latency 0.02]
+"""
+import argparse
+import time
+
+import download
+from mock.compare_backends import snapshot_key
+from mock.generator import generate_group
+from mock.server import Fixture, FixtureServer
+from src.scheduler import RateLimitedAdapter
+
+
+def main(args: argparse.Namespace):
+    if args.fixture:
+        fixture = Fixture.load(args.fixture)
+    else:
+        group = generate_group(args.issues, args.seed)
+        fixture = Fixture(group.epics, group.issues, group.links)
+    print(f"** {len(fixture.issues)} issues, {len(fixture.epics)} epics, latency {args.latency * 1000:.0f}ms, "
+          f"rate limit {args.rate_limit or '-'}/s **")
+
+    with FixtureServer(fixture, page_size=args.page_size, latency=args.latency, jitter=args.jitter,
+                       rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed) as server:
+        download.config['server'] = dict(url=server.url, private_token='fixture', group_no=fixture.group_no)
+        download.config['projects'] = [dict(name=f"project-{p}", project_no=p) for p in fixture.project_ids]
+        download_conf = download.config.setdefault('download', {})
+        download_conf['http_cache'] = False
+        download_conf['scheduler'] = args.scheduler
+        download_conf['link_workers'] = args.link_workers or download_conf.get('link_workers', 8)
+        if args.prefetch is not None:
+            download_conf['prefetch_pages'] = args.prefetch
+
+        expected = None
+        for backend in args.backends:
+            download_conf['backend'] = backend
+            server.reset_counts()
+            start = time.perf_counter()
+            gl = download.connect()
+            result = download.download_all(gl)
+            seconds = time.perf_counter() - start
+
+            key = snapshot_key(*result[:4])
+            expected = expected or key
+            counts = server.request_counts
+            print(f"\n** {backend}: {seconds:.2f}s, {counts.total() - counts['rate_limited']} requests, "
+                  f"{counts['rate_limited']} rejected with 429, {'same' if key == expected else 'DIFFERENT'} model **")
+            print(f"   {dict(counts)}")
+            adapter = gl.session.get_adapter(gl.url)
+            if isinstance(adapter, RateLimitedAdapter):
+                print(f"   {adapter.summary()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--issues', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixture', help="download a fixture recorded with mock.server --record instead")
+    parser.add_argument('--backends', nargs='+', choices=['rest', 'graphql'], default=['rest', 'graphql'])
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--rate-limit', type=float)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--link-workers', type=int, help="overrides download.link_workers of the config")
+    parser.add_argument('--no-scheduler', dest='scheduler', action='store_false',
+                        help="send the requests without the RateLimitedAdapter")
+    parser.add_argument('--prefetch', type=int, help="overrides download.prefetch_pages of the config")
+    main(parser.parse_args())
@@ -0,0 +1,56 @@
+"""Measures how long EpicGraph takes to analyze synthetic groups of epics of growing size.
+
+The epics form trees of next and includes relations with some related links between them, like a group that plans
+its epics with the syntax described in render_epic_relationships. If the analysis is linear, the time per epic stays
+the same for all sizes.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m benchmarks.bench_epic_graph [--sizes 250 500 1000 2000]
+"""
+import argparse
+import random
+import time
+
+from mock.generator import generate_epics
+from src.graph import EpicGraph
+
+
+def timed(timings: dict[str, float], name: str, function):
+    """Wraps a function to add the time it takes to timings[name]"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+    return wrapper
+
+
+def main(sizes: list[int], repeat: int):
+    phases = ['analyze_graph', 'swap_related_trees']
+    print(f"{'epics':>8} {'total':>10} " + " ".join(f"{phase:>20}" for phase in phases) + f" {'analyze/epic':>14}")
+    for size in sizes:
+        epics = generate_epics(random.Random(0), size, max_depth=12, closed_share=0)
+        best: dict[str, float] = {}
+        for _ in range(repeat):
+            timings: dict[str, float] = {}
+            originals = {phase: getattr(EpicGraph, phase) for phase in phases}
+            for phase, function in originals.items():
+                setattr(EpicGraph, phase, timed(timings, phase, function))
+            try:
+                timed(timings, 'total', EpicGraph)(epics)
+            finally:
+                for phase, function in originals.items():
+                    setattr(EpicGraph, phase, function)
+            best = {k: min(v, best.get(k, v)) for k, v in timings.items()}
+
+        print(f"{size:>8} {best['total'] * 1000:>8.1f}ms "
+              + " ".join(f"{best[phase] * 1000:>18.1f}ms" for phase in phases)
+              + f" {best['analyze_graph'] / size * 1e6:>12.1f}µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
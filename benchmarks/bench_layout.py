@@ -0,0 +1,90 @@
+"""Measures the layout of render_epic_relationships on a synthetic group of epics and compares it with the layout
+loop it replaced, which scanned all nodes for every layer and all positions for every probe.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m benchmarks.bench_layout [--epics 5000]
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import src.render as render
+from mock.generator import generate_epics
+from src.graph import EpicGraph
+from src.render import place_epics, render_epic_relationships
+
+
+def place_epics_by_scanning(epic_graph: EpicGraph, nodes: list[int], horizontal=True) -> dict[int, tuple[int, int]]:
+    """The previous layout loop of render_epic_relationships, kept to check that place_epics gives the same result"""
+    positions: dict[int, tuple[int, int]] = {}
+    height = 0
+    cumulative_root_width = 0
+    while len(positions.keys()) != len(nodes):
+        for i in nodes:
+            if epic_graph.node_heights[i] == height and height == 0:
+                positions[i] = (cumulative_root_width, height * 2) if not horizontal \
+                    else (height * 2, cumulative_root_width)
+                cumulative_root_width += epic_graph.tree_widths[i]
+            elif epic_graph.node_heights[i] == height:
+                if not horizontal:
+                    position = (positions[epic_graph.node_parents[i]][0], height * 2)
+                    while position in positions.values():
+                        position = (position[0] + 1, position[1])
+                else:
+                    position = (height * 2, positions[epic_graph.node_parents[i]][1])
+                    while position in positions.values():
+                        position = (position[0], position[1] + 1)
+                positions[i] = position
+        height += 1
+    return positions
+
+
+def best_of(repeat: int, function, *args):
+    """Returns the result and the shortest time of calling the function repeat times"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(count: int, repeat: int, compare: bool):
+    epics = generate_epics(random.Random(0), count, max_depth=12, closed_share=0)
+    epic_graph, analysis = best_of(1, EpicGraph, epics)
+    orphans = set(epic_graph.get_orphans())
+    nodes = [i for i in range(len(epic_graph)) if i not in orphans]
+    layers = len(set(epic_graph.node_heights[i] for i in nodes))
+    print(f"** {count} epics, {len(nodes)} placed in {layers} layers, analysis {analysis * 1000:.1f}ms **")
+
+    for horizontal in [True, False]:
+        positions, placing = best_of(repeat, place_epics, epic_graph, nodes, horizontal)
+        line = f"horizontal={horizontal!s:<5}  place_epics {placing * 1000:8.1f}ms"
+        if compare:
+            expected, scanning = best_of(1, place_epics_by_scanning, epic_graph, nodes, horizontal)
+            same = list(positions.items()) == list(expected.items())
+            line += f"  scanning {scanning * 1000:10.1f}ms  {'same positions' if same else 'DIFFERENT POSITIONS'}"
+        print(line)
+
+    # The whole render without calling Graphviz, the DOT source goes into a directory that is removed afterwards
+    original_render, original_renders = render.render_graph, render.RENDERS
+    render.render_graph = lambda graph, name, format='svg': graph.source
+    try:
+        with tempfile.TemporaryDirectory() as renders:
+            render.RENDERS = Path(renders)
+            _, rendering = best_of(repeat, render_epic_relationships, epics)
+    finally:
+        render.render_graph, render.RENDERS = original_render, original_renders
+    print(f"render_epic_relationships without Graphviz {rendering * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--epics', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-compare', dest='compare', action='store_false',
+                        help="Skip the previous layout loop, which takes long for large groups")
+    args = parser.parse_args()
+    main(args.epics, args.repeat, args.compare)
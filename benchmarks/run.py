@@ -0,0 +1,143 @@
+"""Times the stages from parsing the download to building the renders on generated groups and tracks their peak memory.
+
+Each stage runs repeat times for the time and once more with tracemalloc for the peak of the memory it allocates.
+Graphviz is not called, the renders only write their DOT sources. The results are written as JSON, and compared with
+an earlier result given as baseline: stages that got slower or need more memory by more than the tolerance are
+reported as regressions and make the run fail.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m benchmarks.run [--sizes 1000 10000] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import download
+import src.render as render
+from mock.generator import Group, generate_group
+from src.graph import EpicGraph
+from src.store import SnapshotIndex
+
+
+def stages(group: Group) -> list[tuple[str, Callable[[dict], object]]]:
+    """The stages in the order they run, each gets a dict with the results of the stages before it"""
+    gitlab_issues = group.gitlab_issues()
+    gitlab_epics = group.gitlab_epics()
+    issue_links = group.issue_links()
+
+    def parse_links(d):
+        links_related, links_blocking = download.parse_links(d['issues'], issue_links)
+        return dict(links_related=links_related, links_blocking=links_blocking)
+
+    def render_target(name: str):
+        return lambda d: render.TARGETS[name](d['render_data'], None)
+
+    return [
+        ('parse_issues', lambda d: dict(issues=download.parse_issues(gitlab_issues))),
+        ('parse_epics', lambda d: dict(epics=download.parse_epics(gitlab_epics, d['issues'], False))),
+        ('parse_links', parse_links),
+        ('epic_graph', lambda d: dict(epic_graph=EpicGraph(d['epics']))),
+        ('cluster_epics', lambda d: dict(clusters=render.cluster_epics(d['epics']))),
+        ('snapshot_index', lambda d: dict(index=SnapshotIndex(d['issues'], d['epics']))),
+        ('render_data', lambda d: dict(render_data={k: d[k] for k in ['issues', 'epics', 'links_related',
+                                                                      'links_blocking', 'clusters', 'index']})),
+    ] + [(f"render_{name}", render_target(name)) for name in render.TARGETS]
+
+
+def run_stage(function: Callable[[dict], object], data: dict, repeat: int) -> tuple[object, float, int]:
+    """Returns the result, the shortest time of repeat runs and the peak of the memory allocated during one run"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        function(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run(sizes: list[int], repeat: int, seed: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as renders, open(os.devnull, 'w') as devnull:
+        # only the DOT sources are written, into a directory that is removed afterwards
+        render.RENDERS = Path(renders)
+        render.render_graph = lambda graph, name, format='svg': graph.source
+        for size in sizes:
+            start = time.perf_counter()
+            group = generate_group(size, seed)
+            print(f"** {size} issues, {len(group.epics)} epics, {len(group.links)} links, "
+                  f"generated in {time.perf_counter() - start:.1f}s **")
+
+            data = {}
+            results[str(size)] = {}
+            for name, function in stages(group):
+                with redirect_stdout(devnull):
+                    result, seconds, peak = run_stage(function, data, repeat)
+                if isinstance(result, dict):
+                    data.update(result)
+                results[str(size)][name] = dict(seconds=seconds, peak_mb=peak / 1024 / 1024)
+                print(f"{name:<40} {seconds * 1000:>10.1f}ms {peak / 1024 / 1024:>10.1f}MB")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns the stages that take longer or need more memory than in the baseline by more than the tolerance"""
+    regressions = []
+    for size, size_results in results.items():
+        for stage, result in size_results.items():
+            old = baseline.get(size, {}).get(stage)
+            if old is None:
+                continue
+            for metric, unit in [('seconds', 's'), ('peak_mb', 'MB')]:
+                # tiny values are dominated by noise
+                minimum = 0.005 if metric == 'seconds' else 0.5
+                if result[metric] > max(old[metric], minimum) * (1 + tolerance):
+                    regressions.append(f"{size} issues, {stage}: {metric} {old[metric]:.3f}{unit} -> "
+                                       f"{result[metric]:.3f}{unit}")
+    return regressions
+
+
+def main(sizes: list[int], repeat: int, seed: int, output: str, baseline: str = None, tolerance: float = 0.2):
+    results = run(sizes, repeat, seed)
+    report = dict(created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  python=platform.python_version(), machine=platform.machine(), seed=seed, repeat=repeat,
+                  results=results)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if baseline:
+        regressions = compare(results, json.loads(Path(baseline).read_text())['results'], tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {baseline}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="Numbers of issues of the groups")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default="../cache/benchmarks/latest.json")
+    parser.add_argument('--baseline', help="An earlier result to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative increase of time and memory before a stage counts as regression")
+    args = parser.parse_args()
+    main(args.sizes, args.repeat, args.seed, args.output, args.baseline, args.tolerance)
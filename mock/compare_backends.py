@@ -0,0 +1,45 @@
+"""Downloads the mock data from a local FixtureServer with the REST and the GraphQL backend, checks that both produce
+the same issues, epics and links and compares their number of requests.
+
+Run it from src/ like download.py: PYTHONPATH=.. python -m mock.compare_backends
+"""
+import download
+import mock.data
+from model.classes import Link_Type
+from mock.server import Fixture, FixtureServer
+
+
+def snapshot_key(issues, epics, links_related, links_blocking):
+    """Reduces the parsed model to comparable values"""
+    def values(o):
+        return [getattr(o, attribute, None) for attribute in type(o).__slots__]
+
+    issue_values = {uid: values(issue) for uid, issue in issues.items()}
+    epic_values = {uid: values(epic) for uid, epic in epics.items()}
+    # a related link has no direction, the backends may see either issue first
+    links = sorted((*(sorted((link.source_uid, link.target_uid)) if link.type == Link_Type.RELATES_TO
+                      else (link.source_uid, link.target_uid)), link.type.name)
+                   for link in links_related + links_blocking)
+    return issue_values, epic_values, links
+
+
+def main():
+    fixture = Fixture(mock.data.get_epics(), mock.data.get_issues(), mock.data.get_links())
+    with FixtureServer(fixture) as server:
+        download.config['server'] = dict(url=server.url, private_token='fixture', group_no=fixture.group_no)
+        download.config['projects'] = [dict(name=f"project-{p}", project_no=p) for p in fixture.project_ids]
+
+        results = {}
+        for backend in ['rest', 'graphql']:
+            download.config.setdefault('download', {})['backend'] = backend
+            server.reset_counts()
+            issues, epics, links_related, links_blocking, _ = download.download_all(download.connect())
+            results[backend] = snapshot_key(issues, epics, links_related, links_blocking)
+            print(f"\n** {backend}: {server.request_counts.total()} requests {dict(server.request_counts)} **\n")
+
+    print("Both backends produce the same model" if results['rest'] == results['graphql']
+          else "The backends produce different models!")
+
+
+if __name__ == "__main__":
+    main()
@@ -90,7 +90,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1002] = Issue(Status.CLOSED,
                       1002,
-                      1,
+                      2,
                       44,
                       1,
                       "F1: Add touch support",
@@ -98,7 +98,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1003] = Issue(Status.CLOSED,
                       1003,
-                      1,
+                      3,
                       44,
                       2,
                       "F1: Add touch support",
@@ -106,7 +106,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1004] = Issue(Status.OPENED,
                       1004,
-                      1,
+                      4,
                       44,
                       2,
                       "F1: Add touch support",
@@ -122,7 +122,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1006] = Issue(Status.CLOSED,
                       1006,
-                      1,
+                      5,
                       44,
                       None,
                       "Bug: Race condition in core routing",
@@ -130,7 +130,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1007] = Issue(Status.CLOSED,
                       1007,
-                      1,
+                      6,
                       44,
                       None,
                       "Bug: Feature",
@@ -138,7 +138,7 @@ def get_issues() -> dict[int, Issue]:
                       False)
     issues[1008] = Issue(Status.CLOSED,
                       1008,
-                      1,
+                      7,
                       44,
                       None,
                       "Bug: Race condition in core routing",
@@ -149,5 +149,9 @@ def get_issues() -> dict[int, Issue]:
     return issues
 
 
-def get_links():
-    pass
+def get_links() -> [Link]:
+    issues = get_issues()
+    return [Link(issues[1001], issues[1002], Link_Type.RELATES_TO),
+            Link(issues[1003], issues[1004], Link_Type.BLOCKS),
+            Link(issues[1004], issues[1005], Link_Type.BLOCKS),
+            Link(issues[1006], issues[1008], Link_Type.RELATES_TO)]
@@ -0,0 +1,147 @@
+"""Generates synthetic Gitlab groups of any size for benchmarks and for the FixtureServer.
+
+A group has projects with issues, epics whose descriptions chain them with the relation syntax described in
+render_epic_relationships, and links between issues whose degrees follow a power law, so a few issues have many links
+like in real groups. The same seed always gives the same group.
+"""
+import random
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from download import count_issues, epic_issue_states
+from mock.server import epic_to_json, issue_to_json, reported_links
+from model.classes import Epic, Issue, Link, Link_Type, Status
+
+EPIC_URL = "https://gitlab.example.com/groups/group/-/epics/{uid}"
+ISSUE_URL = "https://gitlab.example.com/group/project-{project}/-/issues/{iid}"
+
+LABELS = ["release::04'24", "release::05'24", "future", "feature", "bug", "technical debt", "team::app", "team::web"]
+WORDS = ["login", "calendar", "timetable", "push", "notification", "settings", "cache", "search", "room", "menu",
+         "news", "offline", "mode", "widget", "export", "onboarding", "dark", "theme", "api", "migration"]
+
+
+@dataclass
+class Group:
+    """The data of a generated group, in the shapes of mock.data and of the Gitlab API"""
+    epics: dict[int, Epic]
+    issues: dict[int, Issue]
+    links: list[Link]
+
+    def issue_links(self) -> dict[int, list[tuple[int, str]]]:
+        """The links of every issue like fetch_issue_links returns them, every link is reported by both issues"""
+        return reported_links(self.issues, self.links)
+
+    def gitlab_issues(self) -> list[SimpleNamespace]:
+        """The issues as objects with the attributes of python-gitlab's issues, for download.parse_issues"""
+        return [SimpleNamespace(**issue_to_json(issue)) for issue in self.issues.values()]
+
+    def gitlab_epics(self, group_no: int = 1) -> list[SimpleNamespace]:
+        """The epics as objects with the attributes of python-gitlab's epics, for download.parse_epics"""
+        return [SimpleNamespace(**epic_to_json(epic, group_no)) for epic in self.epics.values()]
+
+
+def title(rng: random.Random, prefix: str) -> str:
+    return f"{prefix} {' '.join(rng.choices(WORDS, k=rng.randint(2, 6)))}"
+
+
+def generate_group(issue_count: int = 1000, seed: int = 0, epic_count: int = None, project_ids: list[int] = None,
+                   max_depth: int = 30, links_per_issue: float = 1.0, degree_exponent: float = 1.5,
+                   closed_share: float = 0.4) -> Group:
+    """Generates a group with the given number of issues.
+
+    Arguments:
+        epic_count: Optional number of epics. [Default=one for every 20 issues]
+        project_ids: Optional ids of the projects the issues are spread over. [Default=1, 2 and 3 as in the example]
+        max_depth: Optional maximum depth of an epic in the tree of relations it is generated into. [Default=30]
+        links_per_issue: Optional average number of links per issue. [Default=1.0]
+        degree_exponent: Optional exponent of the Pareto distribution of the link degrees, smaller values give a few
+            issues more of the links. [Default=1.5]
+        closed_share: Optional share of closed issues and epics. [Default=0.4]
+    """
+    rng = random.Random(seed)
+    project_ids = project_ids or [1, 2, 3]
+    epic_count = epic_count if epic_count is not None else max(1, issue_count // 20)
+
+    epics = generate_epics(rng, epic_count, max_depth, closed_share)
+    epic_uids = list(epics)
+
+    issues: dict[int, Issue] = {}
+    iids = {project: 0 for project in project_ids}
+    for uid in range(100001, 100001 + issue_count):
+        project = rng.choice(project_ids)
+        iids[project] += 1
+        epic_id = rng.choice(epic_uids) if epic_uids and rng.random() < 0.7 else None
+        status = Status.CLOSED if rng.random() < closed_share else Status.OPENED
+        issues[uid] = Issue(status, uid, iids[project], project, epic_id, title(rng, "Issue:"),
+                            ISSUE_URL.format(project=project, iid=iids[project]), rng.random() < 0.5)
+
+    # the issues and counts of the epics, counted like a download with download.local_epic_counts
+    issue_states = epic_issue_states(issues)
+    for epic in epics.values():
+        count_issues(epic, issue_states.get(epic.uid, {}))
+
+    links = generate_links(rng, list(issues), round(issue_count * links_per_issue), degree_exponent)
+    linked = {uid for link in links for uid in (link.source_uid, link.target_uid)}
+    for uid, issue in issues.items():
+        issue.has_no_links = uid not in linked
+    return Group(epics, issues, links)
+
+
+def generate_epics(rng: random.Random, count: int, max_depth: int, closed_share: float) -> dict[int, Epic]:
+    """Epics in chains and trees of next, previous and includes relations with some related ones between them"""
+    uids = rng.sample(range(1, count * 10 + 1), count)
+    depths: dict[int, int] = {}
+    lines: dict[int, list[str]] = {}
+
+    for k, uid in enumerate(uids):
+        lines[uid] = [f"As a user I want the {' '.join(rng.choices(WORDS, k=4))}.", ""]
+        # mostly continue one of the latest epics, so the chains get long
+        candidates = [parent for parent in uids[max(0, k - 8):k] if depths[parent] < max_depth]
+        if candidates and rng.random() < 0.85:
+            parent = rng.choice(candidates)
+            depths[uid] = depths[parent] + 1
+            kind = rng.random()
+            if kind < 0.4:
+                lines[parent].append(f"- next: {EPIC_URL.format(uid=uid)}")
+            elif kind < 0.7:
+                lines[uid].append(f"- previous: {EPIC_URL.format(uid=parent)}")
+            else:
+                lines[parent].append(f"- includes: {EPIC_URL.format(uid=uid)}+")
+        else:
+            depths[uid] = 0
+        if k and rng.random() < 0.1:
+            lines[uid].append(f"- related: {EPIC_URL.format(uid=rng.choice(uids[:k]))}")
+
+    epics = {}
+    for uid in uids:
+        status = Status.CLOSED if rng.random() < closed_share else Status.OPENED
+        labels = rng.sample(LABELS, rng.randint(0, 3))
+        epics[uid] = Epic(status, uid, title(rng, "Epic:"), labels, "\n".join(lines[uid] + ["", "Acceptance criteria"]),
+                          0, 0)
+    return epics
+
+
+def generate_links(rng: random.Random, uids: list[int], count: int, degree_exponent: float) -> list[Link]:
+    """Links between distinct issues, each end is picked with a weight from a Pareto distribution"""
+    if len(uids) < 2:
+        return []
+    weights = [rng.paretovariate(degree_exponent) for _ in uids]
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+
+    links = []
+    seen: set[tuple[int, int]] = set()
+    for _ in range(count * 2):
+        if len(links) == count:
+            break
+        source, target = rng.choices(uids, cum_weights=cum_weights, k=2)
+        key = (min(source, target), max(source, target))
+        if source == target or key in seen:
+            continue
+        seen.add(key)
+        link_type = Link_Type.BLOCKS if rng.random() < 0.3 else Link_Type.RELATES_TO
+        links.append(Link(source, target, link_type))
+    return links
@@ -0,0 +1,458 @@
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from model.classes import Epic, Issue, Link, Link_Type, Status
+
+GROUP_PATH = 'group'
+
+
+def epic_to_json(epic: Epic, group_no: int) -> dict:
+    return dict(id=100000 + epic.uid,
+                iid=epic.uid,
+                group_id=group_no,
+                title=epic.title,
+                description=epic.description,
+                state='closed' if epic.status == Status.CLOSED else 'opened',
+                labels=list(epic.labels),
+                updated_at='2024-01-01T00:00:00.000Z')
+
+
+def reported_links(uids: Iterable[int], links: list[Link]) -> dict[int, list[tuple[int, str]]]:
+    """The links of every issue as Gitlab reports them, on both of its issues. The blocked issue sees a blocks link as
+    is_blocked_by.
+
+    Returns - the uid of the linked issue and the link type of every link of the issues, by the issue's uid
+    """
+    issue_links: dict[int, list[tuple[int, str]]] = {uid: [] for uid in uids}
+    for link in links:
+        if link.type == Link_Type.BLOCKS:
+            issue_links[link.source_uid].append((link.target_uid, 'blocks'))
+            issue_links[link.target_uid].append((link.source_uid, 'is_blocked_by'))
+        else:
+            issue_links[link.source_uid].append((link.target_uid, 'relates_to'))
+            issue_links[link.target_uid].append((link.source_uid, 'relates_to'))
+    return issue_links
+
+
+def issue_to_json(issue: Issue) -> dict:
+    return dict(id=issue.uid,
+                iid=issue.iid,
+                project_id=issue.project_id,
+                title=issue.title,
+                state='closed' if issue.status == Status.CLOSED else 'opened',
+                web_url=issue.url,
+                epic_iid=issue.epic_id,
+                iteration={'id': 1} if issue.has_iteration else None,
+                updated_at='2024-01-01T00:00:00.000Z')
+
+
+class Fixture:
+    """The epics, issues and links served by the FixtureServer, as Gitlab API JSON.
+
+    A fixture is made from model objects, e.g. the ones of mock.data, mock.generator or a snapshot, or loaded from a
+    file written by save.
+    """
+
+    def __init__(self, epics: dict[int, Epic], issues: dict[int, Issue], links: list[Link], group_no: int = 1):
+        self.group_no = group_no
+        self.epics = [epic_to_json(epic, group_no) for epic in epics.values()]
+        self.issues = [issue_to_json(issue) for issue in issues.values()]
+
+        self.links = reported_links(issues, links)
+        self.index()
+
+    def index(self):
+        """Builds the lookups of the handler, so a request doesn't scan all issues"""
+        self.issues_by_uid = {issue['id']: issue for issue in self.issues}
+        self.epics_by_iid = {epic['iid']: epic for epic in self.epics}
+        self.project_ids = sorted({issue['project_id'] for issue in self.issues})
+        self.issues_by_project: dict[int, list[dict]] = {p: [] for p in self.project_ids}
+        self.issues_by_epic: dict[int, list[dict]] = {}
+        self.issues_by_iid: dict[tuple[int, int], dict] = {}
+        for issue in self.issues:
+            self.issues_by_project[issue['project_id']].append(issue)
+            self.issues_by_iid[(issue['project_id'], issue['iid'])] = issue
+            if issue['epic_iid']:
+                self.issues_by_epic.setdefault(issue['epic_iid'], []).append(issue)
+
+    def save(self, path):
+        """Records the fixture as JSON file, see load"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(dict(group_no=self.group_no, epics=self.epics, issues=self.issues,
+                                              links={str(uid): links for uid, links in self.links.items()})))
+
+    @classmethod
+    def load(cls, path) -> 'Fixture':
+        """Reads a fixture recorded with save"""
+        data = json.loads(Path(path).read_text())
+        fixture = cls.__new__(cls)
+        fixture.group_no = data['group_no']
+        fixture.epics = data['epics']
+        fixture.issues = data['issues']
+        fixture.links = {int(uid): [tuple(link) for link in links] for uid, links in data['links'].items()}
+        fixture.index()
+        return fixture
+
+    def issue_links(self, uid: int) -> list[dict]:
+        return [self.issues_by_uid[target] | dict(link_type=link_type, issue_link_id=n)
+                for n, (target, link_type) in enumerate(self.links[uid])]
+
+
+class FixtureServer:
+    """A local stand-in for the parts of the Gitlab REST and GraphQL API used by download.py.
+
+    It serves a fixed set of epics, issues and links with Gitlab's pagination headers and counts the requests it gets.
+    Use it as a context manager, its url can be used as server url for python-gitlab.
+
+    To test the download under realistic conditions every response can be delayed, and requests can be answered with
+    429 Too Many Requests like Gitlab's rate limits do, with the RateLimit-* and Retry-After headers Gitlab sends.
+
+    Arguments:
+        page_size: Optional default number of items per page of the REST API. [Default=20]
+        max_page_size: Optional maximum of the per_page parameter, like Gitlab's limit. [Default=100]
+        latency: Optional seconds every response is delayed. [Default=0]
+        jitter: Optional maximum of a random delay added to the latency, in seconds. [Default=0]
+        rate_limit: Optional number of requests allowed per second, more are answered with 429. [Default=no limit]
+        error_rate: Optional share of requests answered with 429 at random, regardless of the rate. [Default=0]
+        seed: Optional seed of the random jitter and errors. [Default=0]
+    """
+
+    def __init__(self, fixture: Fixture, page_size: int = 20, port: int = 0, max_page_size: int = 100,
+                 latency: float = 0, jitter: float = 0, rate_limit: float = None, error_rate: float = 0,
+                 seed: int = 0):
+        self.fixture = fixture
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.request_counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # a token bucket that holds the requests of one second
+        self._tokens = rate_limit
+        self._refilled = time.monotonic()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+        self._httpd.fixture_server = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def count(self, kind: str):
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+
+    def admit(self) -> tuple[float, dict]:
+        """Decides how a request is answered
+
+        Returns - the delay of the response and the rate limit headers, with a Retry-After header if the request is
+        rejected
+        """
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            rejected = self.error_rate and self._random.random() < self.error_rate
+            if self.rate_limit is None:
+                return delay, {'Retry-After': '1'} if rejected else {}
+
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens >= 1 and not rejected:
+                self._tokens -= 1
+            else:
+                rejected = True
+            reset = math.ceil((1 - self._tokens) / self.rate_limit) if self._tokens < 1 else 0
+            headers = {'RateLimit-Limit': str(math.ceil(self.rate_limit)),
+                       'RateLimit-Remaining': str(int(self._tokens)),
+                       'RateLimit-Reset': str(int(time.time()) + reset)}
+            if rejected:
+                headers['Retry-After'] = str(max(1, reset))
+            return delay, headers
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        """Serves in the calling thread until it is interrupted"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately, with Nagle's algorithm the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    rest_routes = [
+        ('user', re.compile(r'/user')),
+        ('group', re.compile(r'/groups/(?P<group>\d+)')),
+        ('group_projects', re.compile(r'/groups/(?P<group>\d+)/projects')),
+        ('group_epics', re.compile(r'/groups/(?P<group>\d+)/epics')),
+        ('epic', re.compile(r'/groups/(?P<group>\d+)/epics/(?P<epic>\d+)')),
+        ('epic_issues', re.compile(r'/groups/(?P<group>\d+)/epics/(?P<epic>\d+)/issues')),
+        ('project', re.compile(r'/projects/(?P<project>\d+)')),
+        ('project_issues', re.compile(r'/projects/(?P<project>\d+)/issues')),
+        ('issue_links', re.compile(r'/projects/(?P<project>\d+)/issues/(?P<issue>\d+)/links')),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fixture_server(self) -> FixtureServer:
+        return self.server.fixture_server
+
+    def admit(self) -> bool:
+        """Delays the request and answers it with 429 if the FixtureServer rejects it
+
+        Returns - whether the request can be answered
+        """
+        delay, self.rate_limit_headers = self.fixture_server.admit()
+        if delay:
+            time.sleep(delay)
+        if 'Retry-After' not in self.rate_limit_headers:
+            return True
+        self.fixture_server.count('rate_limited')
+        self.send_json({'message': '429 Too Many Requests'}, 429)
+        return False
+
+    def send_json(self, obj, status: int = 200, headers: dict = None):
+        body = json.dumps(obj).encode()
+        headers = self.rate_limit_headers | (headers or {})
+
+        # conditional requests like Gitlab's Rack::ETag middleware
+        if status == 200 and self.command == 'GET':
+            etag = f'W/"{hashlib.md5(body).hexdigest()}"'
+            headers = (headers or {}) | {'ETag': etag}
+            if self.headers.get('If-None-Match') == etag:
+                self.fixture_server.count('not_modified')
+                self.send_response(304)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, items: list, query: dict):
+        """Sends one page of items with the pagination headers of Gitlab's offset pagination"""
+        page = int(query.get('page', 1))
+        per_page = min(int(query.get('per_page', self.fixture_server.page_size)), self.fixture_server.max_page_size)
+        total_pages = max(1, -(-len(items) // per_page))
+        headers = {'X-Page': str(page),
+                   'X-Per-Page': str(per_page),
+                   'X-Total': str(len(items)),
+                   'X-Total-Pages': str(total_pages)}
+        if page < total_pages:
+            headers['X-Next-Page'] = str(page + 1)
+            next_query = urlencode(query | {'page': page + 1, 'per_page': per_page})
+            headers['Link'] = f'<{self.fixture_server.url}{urlparse(self.path).path}?{next_query}>; rel="next"'
+        self.send_json(items[(page - 1) * per_page:page * per_page], headers=headers)
+
+    def do_GET(self):
+        # a connection handles many requests, the headers of the last one don't belong to this one
+        self.rate_limit_headers = {}
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path.removeprefix('/api/v4')
+        fixture = self.fixture_server.fixture
+        if not self.admit():
+            return
+
+        for kind, route in self.rest_routes:
+            match = route.fullmatch(path)
+            if match:
+                break
+        else:
+            self.send_json({'message': '404 Not Found'}, 404)
+            return
+        self.fixture_server.count(kind)
+        if 'project' in match.groupdict() and int(match['project']) not in fixture.project_ids:
+            self.send_json({'message': '404 Project Not Found'}, 404)
+            return
+
+        def updated(items):
+            if 'updated_after' not in query:
+                return items
+            return [item for item in items if item['updated_at'] >= query['updated_after']]
+
+        if kind == 'user':
+            self.send_json(dict(id=1, username='fixture'))
+        elif kind == 'group':
+            self.send_json(dict(id=fixture.group_no, name=GROUP_PATH, full_path=GROUP_PATH))
+        elif kind == 'group_projects':
+            self.send_page([dict(id=p, name=f"project-{p}") for p in fixture.project_ids], query)
+        elif kind == 'group_epics':
+            self.send_page(updated(fixture.epics), query)
+        elif kind == 'epic':
+            epic = fixture.epics_by_iid.get(int(match['epic']))
+            if epic is None:
+                self.send_json({'message': '404 Epic Not Found'}, 404)
+                return
+            self.send_json(epic)
+        elif kind == 'epic_issues':
+            self.send_page(fixture.issues_by_epic.get(int(match['epic']), []), query)
+        elif kind == 'project':
+            project = int(match['project'])
+            self.send_json(dict(id=project, name=f"project-{project}",
+                                path_with_namespace=f"{GROUP_PATH}/project-{project}"))
+        elif kind == 'project_issues':
+            self.send_page(updated(fixture.issues_by_project.get(int(match['project']), [])), query)
+        elif kind == 'issue_links':
+            issue = fixture.issues_by_iid.get((int(match['project']), int(match['issue'])))
+            if issue is None:
+                self.send_json({'message': '404 Issue Not Found'}, 404)
+                return
+            # Gitlab doesn't paginate the links of an issue
+            self.send_json(fixture.issue_links(issue['id']))
+
+    def do_POST(self):
+        self.rate_limit_headers = {}
+        if urlparse(self.path).path != '/api/graphql':
+            self.send_json({'message': '404 Not Found'}, 404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if not self.admit():
+            return
+        self.fixture_server.count('graphql')
+        variables = request.get('variables') or {}
+        fixture = self.fixture_server.fixture
+
+        def connection(items: list):
+            """One page of a GraphQL connection, the cursor is the encoded offset"""
+            start = int(base64.b64decode(variables['after'])) if variables.get('after') else 0
+            end = start + (variables.get('first') or 100)
+            return {'pageInfo': {'hasNextPage': end < len(items),
+                                 'endCursor': base64.b64encode(str(end).encode()).decode()},
+                    'nodes': items[start:end]}
+
+        operation = request.get('operationName')
+        if operation == 'ProjectPaths':
+            ids = [int(gid.rsplit('/', 1)[-1]) for gid in variables.get('ids') or []]
+            data = {'projects': connection([{'id': f"gid://gitlab/Project/{p}",
+                                             'fullPath': f"{GROUP_PATH}/project-{p}"} for p in ids
+                                            if p in fixture.project_ids])}
+        elif operation == 'GroupEpics':
+            data = {'group': {'epics': connection([graphql_epic(e) for e in fixture.epics])}}
+        elif operation == 'ProjectIssues':
+            project = int(variables['fullPath'].rsplit('-', 1)[-1])
+            data = {'project': {'issues': connection([graphql_issue(i, fixture)
+                                                      for i in fixture.issues_by_project.get(project, [])])}}
+        else:
+            self.send_json({'errors': [{'message': f"Unknown operation {operation}"}]})
+            return
+        self.send_json({'data': data})
+
+
+def graphql_epic(epic: dict) -> dict:
+    return {'iid': str(epic['iid']),
+            'title': epic['title'],
+            'state': epic['state'],
+            'description': epic['description'],
+            'updatedAt': epic['updated_at'],
+            'labels': {'nodes': [{'title': label} for label in epic['labels']]}}
+
+
+def graphql_issue(issue: dict, fixture: Fixture) -> dict:
+    links = fixture.links[issue['id']]
+    return {'id': f"gid://gitlab/Issue/{issue['id']}",
+            'iid': str(issue['iid']),
+            'projectId': issue['project_id'],
+            'state': issue['state'],
+            'title': issue['title'],
+            'webUrl': issue['web_url'],
+            'updatedAt': issue['updated_at'],
+            'iteration': issue['iteration'],
+            'epic': {'iid': str(issue['epic_iid'])} if issue['epic_iid'] else None,
+            'linkedWorkItems': {'pageInfo': {'hasNextPage': len(links) > 100},
+                                'nodes': [{'linkType': link_type, 'workItem': {'id': f"gid://gitlab/WorkItem/{target}"}}
+                                          for target, link_type in links[:100]]}}
+
+
+def load_fixture(args: argparse.Namespace) -> Fixture:
+    """The fixture given on the command line: a recorded one, the data of a snapshot or a generated group"""
+    if args.fixture:
+        return Fixture.load(args.fixture)
+    if args.snapshot:
+        from src.store import Snapshot
+        with Snapshot(args.snapshot) as snapshot:
+            links = snapshot.load_links(Link_Type.RELATES_TO) + snapshot.load_links(Link_Type.BLOCKS)
+            return Fixture(snapshot.load_epics(), snapshot.load_issues(), links)
+    from mock.generator import generate_group
+    group = generate_group(args.issues, args.seed)
+    return Fixture(group.epics, group.issues, group.links)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fixture like the Gitlab API until interrupted")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fixture', help="serve a fixture recorded with --record")
+    source.add_argument('--snapshot', help="serve the data of a snapshot written by download.py")
+    parser.add_argument('--issues', type=int, default=1000,
+                        help="number of issues of the generated group served without --fixture or --snapshot")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record', help="write the served fixture to this file")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0, help="seconds every response is delayed")
+    parser.add_argument('--jitter', type=float, default=0, help="maximum random delay added to the latency")
+    parser.add_argument('--rate-limit', type=float, help="requests per second, more are answered with 429")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of requests answered with 429 at random")
+    args = parser.parse_args()
+
+    fixture = load_fixture(args)
+    if args.record:
+        fixture.save(args.record)
+        print(f"Fixture recorded to {args.record}")
+    server = FixtureServer(fixture, args.page_size, args.port, latency=args.latency, jitter=args.jitter,
+                           rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed)
+    print(f"Serving {len(fixture.epics)} epics and {len(fixture.issues)} issues at {server.url}, "
+          f"group_no = {fixture.group_no}, project_no = {', '.join(map(str, fixture.project_ids))}")
+    server.serve_forever()
+    print(f"Requests: {dict(server.request_counts)}")
+
+
+if __name__ == "__main__":
+    main()
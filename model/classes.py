@@ -15,6 +15,8 @@ class Link_Type(Enum):
 
 
 class Issue:
+    __slots__ = ('uid', 'iid', 'project_id', 'title', 'status', 'epic_id', 'has_no_links', 'url', 'has_iteration')
+
     uid: int
     iid: int
     project_id: int
@@ -24,7 +26,6 @@ class Issue:
     has_no_links: bool
     url: str
     has_iteration: bool
-    epic_no: int
 
     def __init__(self, status, uid, iid, project_id, epic_id, title, url, has_iteration):
         self.uid = uid
@@ -42,6 +43,8 @@ class Issue:
 
 
 class Cluster:
+    __slots__ = ('id', 'name', 'epics')
+
     id: int
     name: str
     epics: List['Epic']
@@ -55,6 +58,8 @@ class Cluster:
 
 
 class Epic:
+    __slots__ = ('uid', 'title', 'status', 'labels', 'description', 'count_closed', 'count_all_issues', 'issue_uids')
+
     uid: int
     title: str
     status: Status
@@ -84,30 +89,38 @@ class Epic:
 
 
 class Link:
-    source: Issue
-    target: Issue
+    """A link between two issues. Only the uids of the issues are kept, so links stay small and don't drag copies of
+    the issues along when they are stored."""
+    __slots__ = ('source_uid', 'target_uid', 'type')
+
+    source_uid: int
+    target_uid: int
     type: Link_Type
 
     def __init__(self, source, target, type):
-        self.source = source
-        self.target = target
+        """The source and target can be given as issue uids or, as before, as Issue objects."""
+        self.source_uid = source.uid if isinstance(source, Issue) else source
+        self.target_uid = target.uid if isinstance(target, Issue) else target
         self.type = type
-    def __str__(self):
 
-        if self.target is None:
-            print(self.source)
-        return "({u1}) {p1}/{id1} {t} ({u2}) {p2}/{id2}".format(
-            p1=self.source.project_id,
-            id1=self.source.iid,
-            p2=self.target.project_id,
-            id2=self.target.iid,
-            u1=self.source.uid,
-            u2=self.target.uid,
+    def __str__(self):
+        return "({u1}) {t} ({u2})".format(
+            u1=self.source_uid,
+            u2=self.target_uid,
             t=self.type
         )
 
+    def describe(self, issues: dict[int, Issue]) -> str:
+        """Like str(), with the project and iid of the issues as well. The link only keeps the uids, so they are looked
+        up in the given issues, an issue that isn't one of them is shown with its uid only."""
+        def issue_string(uid: int) -> str:
+            issue = issues.get(uid)
+            return f"({uid}) {issue.project_id}/{issue.iid}" if issue else f"({uid})"
+
+        return f"{issue_string(self.source_uid)} {self.type} {issue_string(self.target_uid)}"
+
     def __eq__(self, other):
-        if self.source.uid == other.target.uid:
+        if self.source_uid == other.target_uid:
             return True
         return False
 
@@ -1,4 +1,6 @@
 from download import *
+from gitlab_graphql import *
 from graph import *
 from render import *
+from store import *
 from utils import *
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterator, Union
+
+
+class DiskLRU:
+    """A directory of cache entries with a maximum size. An entry is one or more files named after its key, like
+    key.json and key.body. They are replaced atomically, and once the maximum size is exceeded the least recently
+    used entries are deleted. The size is counted once at the start and then kept up to date, so writing an entry
+    doesn't scan the directory.
+
+    Arguments:
+        directory: The directory the entries are stored in.
+        max_size: Maximum size of all entries in bytes.
+    """
+
+    def __init__(self, directory, max_size: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self.files())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def path(self, key: str, suffix: str = '') -> Path:
+        return self.directory / f"{key}{suffix}"
+
+    def files(self) -> Iterator[Path]:
+        """The files of all entries, without the temporary ones of writes in progress"""
+        return (path for path in self.directory.iterdir() if path.suffix != '.tmp')
+
+    def touch(self, key: str, suffix: str = ''):
+        """Marks an entry as recently used for the eviction
+
+        Raises FileNotFoundError if the file doesn't exist
+        """
+        os.utime(self.path(key, suffix))
+
+    def write(self, key: str, files: dict[str, Union[bytes, Path]]):
+        """Writes the files of an entry, given as their content or as a file to copy, by their suffix. Every file is
+        written to a temporary file first and then replaced, so another thread never reads a partial one.
+        """
+        size = 0
+        for suffix, data in files.items():
+            path = self.path(key, suffix)
+            tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            if isinstance(data, Path):
+                shutil.copyfile(data, tmp)
+            else:
+                tmp.write_bytes(data)
+            size += tmp.stat().st_size - (path.stat().st_size if path.exists() else 0)
+            os.replace(tmp, path)
+
+        with self._lock:
+            self._size += size
+            if self._size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache is at 90% of its maximum size, called with the
+        lock held"""
+        entries: dict[str, list[Path]] = {}
+        for path in self.files():
+            entries.setdefault(path.name.split('.', 1)[0], []).append(path)
+
+        def last_used(paths: list[Path]) -> float:
+            return max(path.stat().st_mtime for path in paths)
+
+        for paths in sorted(entries.values(), key=last_used):
+            if self._size <= self.max_size * 0.9:
+                break
+            for path in paths:
+                try:
+                    self._size -= path.stat().st_size
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,243 @@
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from io import StringIO
+from pathlib import Path
+from typing import Iterator, Optional
+
+import graphviz
+from graphviz import quoting
+
+# Attributes that usually differ from node to node or edge to edge, they are never moved into a shared block
+OWN_ATTRIBUTES = {'label', 'URL', 'pos', 'tooltip', 'id'}
+# Number of statements of the graph that are collected before they are written
+FLUSH_SIZE = 1024
+
+
+@lru_cache(maxsize=None, typed=True)
+def quote(identifier: str) -> str:
+    """graphviz' quoting, cached because the same names and values are quoted over and over. typed=True keeps the
+    escaped strings of graphviz.escape apart from plain strings with the same content."""
+    return quoting.quote(identifier)
+
+
+@lru_cache(maxsize=None)
+def quote_edge(identifier: str) -> str:
+    return quoting.quote_edge(identifier)
+
+
+def a_list(attrs: dict, label: Optional[str] = None) -> str:
+    """The attributes as DOT a_list, sorted like graphviz does for plain dicts"""
+    result = [f"label={quote(label)}"] if label is not None else []
+    result += [f"{quote(k)}={quote(v)}" for k, v in sorted(attrs.items()) if v is not None]
+    return ' '.join(result)
+
+
+def attr_list(attrs: dict, label: Optional[str] = None) -> str:
+    content = a_list(attrs, label)
+    return f" [{content}]" if content else ''
+
+
+class DotWriter:
+    """Writes the DOT source of a directed graph with the part of the interface of graphviz.Digraph used by the
+    renders, so it can be used in its place.
+
+    The statements of the graph are written to the file in chunks of FLUSH_SIZE, subgraphs are kept until they are
+    complete, because their statements belong where the subgraph is closed. Runs of at least min_shared_run
+    consecutive nodes or edges with the same attributes apart from OWN_ATTRIBUTES are written into an anonymous block
+    that declares these attributes once. Nodes that already appeared in an earlier statement are always written with
+    all their attributes, since Graphviz only applies the defaults of a block to nodes that are new.
+
+    The source is written to a temporary file next to filename, which only replaces filename when the graph is closed.
+    Use it as a context manager: if building the graph raises, the temporary file is deleted and an earlier source at
+    filename stays as it was.
+
+    Arguments:
+        filename: Optional file the source is written to. [Default=kept in memory]
+        engine: The layout engine used by render and pipe. [Default='dot']
+        min_shared_run: Optional minimum length of a run of nodes or edges that gets a shared block. [Default=3]
+    """
+
+    def __init__(self, filename=None, engine: str = 'dot', graph_attr: dict = None, node_attr: dict = None,
+                 edge_attr: dict = None, name: str = None, min_shared_run: int = 3, _root: 'DotWriter' = None):
+        self.filename = Path(filename) if filename is not None else None
+        self.engine = engine
+        self.name = name
+        self.graph_attr = dict(graph_attr or {})
+        self.node_attr = dict(node_attr or {})
+        self.edge_attr = dict(edge_attr or {})
+        self.min_shared_run = min_shared_run
+
+        self._items: list[tuple] = []  # the statements that are not written yet
+        self._root = _root if _root is not None else self
+        if _root is None:
+            self._tmp = self.filename.with_name(f"{self.filename.name}.{threading.get_ident()}.tmp") \
+                if self.filename else None
+            self._out = open(self._tmp, 'w', encoding='utf-8') if self._tmp else StringIO()
+            self._mentioned: set[str] = set()  # the nodes that appeared in the statements written so far
+            self._started = False
+            self._source = None
+
+    def __enter__(self) -> 'DotWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    # The interface of graphviz.Digraph
+
+    def node(self, name: str, label: Optional[str] = None, **attrs):
+        self._add(('node', quote(name), label, attrs))
+
+    def edge(self, tail_name: str, head_name: str, label: Optional[str] = None, **attrs):
+        self._add(('edge', quote_edge(tail_name), quote_edge(head_name), label, attrs))
+
+    def attr(self, kw: Optional[str] = None, **attrs):
+        if not attrs:
+            return
+        line = a_list(attrs) if kw is None else f"{kw}{attr_list(attrs)}"
+        self._add(('line', line))
+
+    @contextmanager
+    def subgraph(self, name: str = None):
+        subgraph = DotWriter(engine=self.engine, name=name, min_shared_run=self.min_shared_run, _root=self._root)
+        yield subgraph
+        self._add(('subgraph', subgraph))
+
+    @property
+    def source(self) -> str:
+        self.close()
+        if self._source is None:
+            self._source = self.filename.read_text(encoding='utf-8')
+        return self._source
+
+    def save(self, filename=None) -> str:
+        self.close()
+        if filename is not None and (self.filename is None or Path(filename).resolve() != self.filename.resolve()):
+            Path(filename).write_text(self.source, encoding='utf-8')
+            return str(filename)
+        return str(self.filename)
+
+    def render(self, filename=None, format: str = 'svg', view: bool = False) -> str:
+        filepath = self.save(filename)
+        return graphviz.render(self.engine, format, filepath)
+
+    def pipe(self, format: str = 'svg') -> bytes:
+        return graphviz.pipe(self.engine, format, self.source.encode('utf-8'))
+
+    def close(self):
+        """Writes the end of the graph, nothing can be added afterwards"""
+        root = self._root
+        if root._out.closed:
+            return
+        root._flush()
+        root._out.write('}\n')
+        if root.filename is None:
+            root._source = root._out.getvalue()
+        root._out.close()
+        if root._tmp is not None:
+            os.replace(root._tmp, root.filename)
+
+    def discard(self):
+        """Stops writing an incomplete graph and deletes its temporary file"""
+        root = self._root
+        if root._out.closed:
+            return
+        root._out.close()
+        if root._tmp is not None:
+            root._tmp.unlink(missing_ok=True)
+
+    # Writing
+
+    def _add(self, item: tuple):
+        self._items.append(item)
+        if self is self._root and len(self._items) >= FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._start()
+        self._out.writelines(self._lines(self._items, 0))
+        self._items = []
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        self._out.write(f"digraph {quote(self.name) + ' ' if self.name else ''}{{\n")
+        self._out.writelines(self._attr_lines(1))
+
+    def _attr_lines(self, depth: int) -> Iterator[str]:
+        indent = '\t' * depth
+        for kw, attrs in [('graph', self.graph_attr), ('node', self.node_attr), ('edge', self.edge_attr)]:
+            if attrs:
+                yield f"{indent}{kw}{attr_list(attrs)}\n"
+
+    def _lines(self, items: list[tuple], depth: int) -> Iterator[str]:
+        """The lines of the items of a graph at the given nesting depth, with shared blocks for runs of nodes and
+        edges. Only called for items that are written right away, so the nodes mentioned so far are known."""
+        indent = '\t' * (depth + 1)
+        mentioned = self._root._mentioned
+        k = 0
+        while k < len(items):
+            kind = items[k][0]
+            if kind in ('node', 'edge'):
+                run = self._shared_run(items, k, mentioned)
+                if len(run) >= self.min_shared_run:
+                    shared = {a: v for a, v in run[0][-1].items() if a not in OWN_ATTRIBUTES}
+                    yield f"{indent}{{\n{indent}\t{kind}{attr_list(shared)}\n"
+                    for item in run:
+                        own = {a: v for a, v in item[-1].items() if a in OWN_ATTRIBUTES}
+                        yield from self._statement(item, own, indent + '\t', mentioned)
+                    yield f"{indent}}}\n"
+                    k += len(run)
+                    continue
+                yield from self._statement(items[k], items[k][-1], indent, mentioned)
+            elif kind == 'line':
+                yield f"{indent}{items[k][1]}\n"
+            elif kind == 'subgraph':
+                subgraph: DotWriter = items[k][1]
+                yield f"{indent}subgraph {quote(subgraph.name)} {{\n" if subgraph.name else f"{indent}{{\n"
+                yield from subgraph._attr_lines(depth + 2)
+                yield from self._lines(subgraph._items, depth + 1)
+                yield f"{indent}}}\n"
+                subgraph._items = []
+            k += 1
+
+    @staticmethod
+    def _statement(item: tuple, attrs: dict, indent: str, mentioned: set[str]) -> Iterator[str]:
+        if item[0] == 'node':
+            _, name, label, _ = item
+            mentioned.add(name)
+            yield f"{indent}{name}{attr_list(attrs, label)}\n"
+        else:
+            _, tail, head, label, _ = item
+            mentioned.add(tail)
+            mentioned.add(head)
+            yield f"{indent}{tail} -> {head}{attr_list(attrs, label)}\n"
+
+    def _shared_run(self, items: list[tuple], start: int, mentioned: set[str]) -> list[tuple]:
+        """The consecutive items from start on that are of the same kind and share all attributes apart from
+        OWN_ATTRIBUTES. A run of nodes ends before a node that was mentioned before or appears twice."""
+        kind = items[start][0]
+
+        def shared(item):
+            return {a: v for a, v in item[-1].items() if a not in OWN_ATTRIBUTES and v is not None}
+
+        first = shared(items[start])
+        if not first:
+            return []
+        run = []
+        names = set()
+        for item in items[start:]:
+            if item[0] != kind or shared(item) != first:
+                break
+            if kind == 'node':
+                if item[1] in mentioned or item[1] in names:
+                    break
+                names.add(item[1])
+            run.append(item)
+        return run
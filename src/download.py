@@ -1,10 +1,17 @@
+import argparse
 import gitlab
-import pickle
 import tomllib
-from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import time
 
 from model.classes import *
+from src.gitlab_graphql import download_graphql
+from src.http_cache import CachingAdapter
+from src.instrument import add_arguments, instrumentation, instrumented, phase
+from src.pagination import list_all
+from src.scheduler import RateLimitedAdapter, ScheduledGitlab
+from src.store import Snapshot, save_snapshot
 from src.utils import time_string
 
 projects_raw = []
@@ -13,61 +20,323 @@ with open("../settings/config.toml", mode="rb") as filehandle:
     config = tomllib.load(filehandle)
 
 
-def main():
-    (epics_raw, issues_raw) = download()
-    epics: dict[int, Epic] = parse_epics(epics_raw)
-    #print(epics)
-    issues: dict[int, Issue] = parse_issues(issues_raw)
-    #print(issues)
-    links_related, links_blocking = parse_links(issues_raw, issues)
+def main(incremental: bool = False):
+    """Downloads and parses everything and saves it as snapshot for the rendering.
+
+    Arguments:
+        incremental: Optional. If True only epics and issues updated since the last run are downloaded and merged
+            into the previous snapshot. Without a previous snapshot everything is downloaded. [Default=False]
+    """
+    gl = connect()
+    with phase('snapshot.load'):
+        snapshot = load_snapshot() if incremental else None
+    if snapshot is None:
+        if incremental:
+            print("No previous download found, downloading everything...")
+        issues, epics, links_related, links_blocking, sync_cursor = download_all(gl)
+    else:
+        issues, epics, links_related, links_blocking, sync_cursor = sync(gl, *snapshot)
+
+    adapter = gl.session.get_adapter(gl.url)
+    if isinstance(adapter, CachingAdapter):
+        print(adapter.summary())
+        adapter = adapter.inner
+    if isinstance(adapter, RateLimitedAdapter):
+        print(adapter.summary())
 
     # dump
     print("***")
     print("Dump parsed stuff")
-    Path("../pickles").mkdir(parents=True, exist_ok=True)
-    pickle.dump(issues, open("../pickles/issues_conv.p", "wb"))
-    pickle.dump(links_related, open("../pickles/links_related.p", "wb"))
-    pickle.dump(links_blocking, open("../pickles/links_blocking.p", "wb"))
-    pickle.dump(epics, open("../pickles/epics_conv.p", "wb"))
+    with phase('snapshot.save'):
+        save_snapshot(issues, epics, links_related, links_blocking, sync_cursor)
     print("***")
 
 
-def download():
-    # private token or personal token authentication (GitLab.com)
+def download_all(gl: gitlab.Gitlab):
+    """Downloads and parses all epics, issues and links with the backend set in the config
+
+    Returns - a tuple of issues, epics, links_related, links_blocking and the sync cursor for the next incremental run
+    """
+    started = datetime.now(timezone.utc)
+    backend = config.get('download', {}).get('backend', 'rest')
+    if backend == 'graphql':
+        with phase('download.graphql'):
+            (epics_raw, issues_raw, issue_links) = download_graphql(gl,
+                                                                    config['server']['group_no'],
+                                                                    config['projects'],
+                                                                    config['download'].get('graphql_page_size', 100))
+        with phase('parse.issues'):
+            issues: dict[int, Issue] = parse_issues(issues_raw)
+    else:
+        (epics_raw, issues, issue_links) = download(gl)
+    #print(issues)
+    with phase('parse.epics'):
+        epics: dict[int, Epic] = parse_configured_epics(epics_raw, issues)
+    #print(epics)
+    with phase('parse.links'):
+        links_related, links_blocking = parse_links(issues, issue_links)
+    mark_issues_without_links(issues, links_related + links_blocking)
+    return issues, epics, links_related, links_blocking, sync_cursor(started)
+
+
+def load_snapshot():
+    """Loads the previous snapshot and its sync cursor.
+
+    Returns - a tuple of issues, epics, links_related, links_blocking and the sync cursor, or None if there is no
+    previous snapshot to continue from
+    """
+    try:
+        snapshot = Snapshot()
+    except (FileNotFoundError, ValueError):
+        return None
+    with snapshot:
+        cursor = snapshot.sync_cursor()
+        if cursor is None:
+            return None
+        issues: dict[int, Issue] = snapshot.load_issues()
+        epics: dict[int, Epic] = snapshot.load_epics()
+        links_related: RelatedList = snapshot.load_links(Link_Type.RELATES_TO)
+        links_blocking: BlockList = snapshot.load_links(Link_Type.BLOCKS)
+    return issues, epics, links_related, links_blocking, cursor
+
+
+def sync(gl: gitlab.Gitlab, issues: dict[int, Issue], epics: dict[int, Epic], links_related: RelatedList,
+         links_blocking: BlockList, updated_after: str):
+    """Downloads the epics and issues updated since updated_after and merges them into the given data.
+
+    The links are only requested for the updated issues. Deleted issues and epics are noticed by comparing the number
+    of known issues and epics with the totals reported by Gitlab, the full lists are only requested on a mismatch.
+    The issues of the updated epics and of the epics an updated or deleted issue belonged to are counted again like
+    download_all counts them: from the merged issues, or requested again if the config counts issues with requests.
+
+    Returns - a tuple of issues, epics, links_related, links_blocking and the new sync cursor
+    """
+    print(f"Synchronizing changes since {updated_after}...")
+    started = datetime.now(timezone.utc)
+    (epics_raw, changed_issues, issue_links) = download(gl, updated_after)
+
+    # issues
+    with phase('sync.deleted_issues'):
+        deleted_issues = find_deleted_issues(gl, issues, changed_issues)
+    # the epics that an updated or deleted issue belonged to before or belongs to now
+    affected_epics = {issues[uid].epic_id for uid in changed_issues.keys() | deleted_issues if uid in issues}
+    affected_epics |= {issue.epic_id for issue in changed_issues.values()}
+    issues = {uid: issue for uid, issue in issues.items() if uid not in deleted_issues}
+    issues.update(changed_issues)
+
+    # links: every link touching an updated issue is replaced by the freshly requested ones
+    touched = changed_issues.keys() | deleted_issues
+    links_related = [link for link in links_related if not link_touches(link, touched)]
+    links_blocking = [link for link in links_blocking if not link_touches(link, touched)]
+    with phase('parse.links'):
+        new_related, new_blocking = parse_links(issues, issue_links)
+    links_related.extend(new_related)
+    links_blocking.extend(new_blocking)
+    # a link of an updated issue can add or remove the last link of an issue that wasn't updated
+    mark_issues_without_links(issues, links_related + links_blocking)
+
+    # epics
+    with phase('parse.epics'):
+        changed_epics = parse_configured_epics(epics_raw, issues)
+    with phase('sync.deleted_epics'):
+        deleted_epics = find_deleted_epics(gl, epics, changed_epics)
+    epics = {uid: epic for uid, epic in epics.items() if uid not in deleted_epics}
+    epics.update(changed_epics)
+
+    affected_epics = {uid for uid in affected_epics if uid in epics} - changed_epics.keys()
+    with phase('sync.epic_counts'):
+        if epic_counts_need_requests():
+            project_group = gl.groups.get(config['server']['group_no'], lazy=True)
+            epics.update(parse_configured_epics([project_group.epics.get(uid) for uid in affected_epics], issues))
+        else:
+            issue_states = epic_issue_states(issues)
+            for uid in affected_epics:
+                count_issues(epics[uid], issue_states.get(uid, {}))
 
-    url = config['server']['url']
+    print(f"** Synchronized: {len(changed_issues)} issues and {len(changed_epics)} epics updated, "
+          f"{len(deleted_issues)} issues and {len(deleted_epics)} epics deleted **")
+    return issues, epics, links_related, links_blocking, sync_cursor(started)
+
+
+def sync_cursor(started: datetime) -> str:
+    """Returns the updated_after of the next sync: the start of this download minus download.sync_margin_seconds.
 
-    gl = gitlab.Gitlab(url, config['server']['private_token'])
+    The highest updated_at of the downloaded objects can't be used. A project listed early would miss the issues
+    edited after it was listed but before a later project showed a newer update. The margin also covers a clock
+    difference to the server. Objects updated within it are downloaded again by the next sync.
+    """
+    margin = timedelta(seconds=config.get('download', {}).get('sync_margin_seconds', 300))
+    return (started - margin).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def connect() -> gitlab.Gitlab:
+    """Creates an authenticated Gitlab client. If download.http_cache is set in the config, its responses are cached
+    on disk and revalidated with conditional requests. Unless download.scheduler is turned off, all requests go through
+    a RateLimitedAdapter, which sits below the cache, so only the requests that reach the server are scheduled."""
+    download_conf = config.get('download', {})
+    scheduled = download_conf.get('scheduler', True)
+    # private token or personal token authentication (GitLab.com)
+    gl = (ScheduledGitlab if scheduled else gitlab.Gitlab)(config['server']['url'], config['server']['private_token'])
+    instrumentation.install(gl.session)
+
+    adapter = None
+    if scheduled:
+        adapter = RateLimitedAdapter(initial_concurrency=download_conf.get('initial_concurrency', 8),
+                                     max_concurrency=download_conf.get('max_concurrency', 32),
+                                     max_retries=download_conf.get('max_retries', 5))
+    if download_conf.get('http_cache', False):
+        adapter = CachingAdapter(download_conf.get('http_cache_dir', '../cache/http'),
+                                 download_conf.get('http_cache_size_mb', 200) * 1024 * 1024, adapter)
+    if adapter is not None:
+        gl.session.mount(gl.url, adapter)
 
     print("Authenticate...")
-    gl.auth()
+    with phase('authenticate'):
+        gl.auth()
     print("Successful!")
+    return gl
+
+
+def download(gl: gitlab.Gitlab, updated_after: str = None):
+    """Downloads the epics of the group and streams the issues of the configured projects.
+
+    The issues are requested page by page, a few pages ahead, and converted into Issue objects right away, while the
+    links of every issue are requested on a bounded pool of worker threads. The raw python-gitlab objects of an issue
+    page are dropped as soon as it is parsed, so they don't pile up for the whole group.
+
+    Arguments:
+        updated_after: Optional ISO timestamp. If given only epics and issues updated since then are downloaded.
+
+    Returns - a tuple of the raw epics, the parsed issues and the links of each issue by the issue's uid
+    """
+    url = config['server']['url']
+    filters = {'updated_after': updated_after} if updated_after else {}
+    download_conf = config.get('download', {})
 
     group_no = config['server']['group_no']
-    project_group = gl.groups.get(group_no)
-    print(f"Downloading things from {url}, group {group_no} \"{project_group.name}\"...")
+    with phase('download.group'):
+        project_group = gl.groups.get(group_no)
+        print(f"Downloading things from {url}, group {group_no} \"{project_group.name}\"...")
 
-    projects = project_group.projects.list()
+        projects = project_group.projects.list()
     print("** Projects in group: ({n}) **".format(n=len(projects)))
 
-    epics_raw = [e for e in project_group.epics.list(get_all=True, scope='all')]
+    with phase('download.epics'):
+        epics_raw = list(list_pages(project_group.epics, scope='all', **filters))
     print("** Epics in group: ({n}) **".format(n=len(epics_raw)))
 
 
     projects_conf = config['projects']
-    print(f"** Requesting Issues in {len(projects_conf)} projects...**")
-
-    issues_raw = []
-    for p in projects_conf:
-        name = p['name']
-        number = p['project_no']
-
-        issues_project = gl.projects.get(number).issues.list(get_all=True, scope='all')
-        issues_raw = issues_raw + issues_project
-
-        print(f"** Issues {name}: ({len(issues_project)}) **")
+    link_workers = download_conf.get('link_workers', 8)
+    print(f"** Requesting Issues in {len(projects_conf)} projects, their links with {link_workers} workers...**")
 
-    return epics_raw, issues_raw
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=link_workers) as link_executor, \
+            ThreadPoolExecutor(max_workers=download_conf.get('project_workers', 4)) as project_executor:
+        streams = project_executor.map(lambda p: stream_project_issues(gl, p, link_executor, **filters),
+                                       projects_conf)
+
+        # map() keeps the order of the configured projects, so the parsed output does not depend on the workers
+        issues: dict[int, Issue] = {}
+        link_futures: dict[int, Future] = {}
+        # the links are requested while the issues are listed, their phase only covers the rest
+        with phase('download.issues'):
+            for p, (project_issues, project_link_futures) in zip(projects_conf, streams):
+                issues.update(project_issues)
+                link_futures.update(project_link_futures)
+                print(f"** Issues {p['name']}: ({len(project_issues)}) **")
+
+        with phase('download.links'):
+            issue_links = {uid: future.result() for uid, future in link_futures.items()}
+    time_taken = time.time() - start
+
+    requests_per_second = len(issue_links) / time_taken if time_taken > 0 else 0
+    print(f"** Links: {len(issue_links)} requests in {time_string(time_taken)} "
+          f"({requests_per_second:.1f} requests/s) **")
+    return epics_raw, issues, issue_links
+
+
+def stream_project_issues(gl: gitlab.Gitlab, project_conf: dict, link_executor: ThreadPoolExecutor, **filters):
+    """Pages through the issues of one configured project, parses them and submits the requests for their links.
+
+    The filters are passed on to the Gitlab API.
+
+    Returns - a tuple of the parsed issues and the futures of their links by the issue's uid
+    """
+    project = gl.projects.get(project_conf['project_no'], lazy=True)
+
+    issues: dict[int, Issue] = {}
+    link_futures: dict[int, Future] = {}
+    for issue_raw in list_pages(project.issues, scope='all', **filters):
+        issue = parse_issue(issue_raw)
+        issues[issue.uid] = issue
+        link_futures[issue.uid] = link_executor.submit(fetch_issue_links, gl, issue)
+    return issues, link_futures
+
+
+def list_pages(manager, **filters):
+    """Lists all objects of a python-gitlab manager with the pagination configured in download, see list_all"""
+    download_conf = config.get('download', {})
+    return list_all(manager, download_conf.get('page_size', 100), prefetch=download_conf.get('prefetch_pages', 2),
+                    **filters)
+
+
+def fetch_issue_links(gl: gitlab.Gitlab, issue: Issue) -> list[tuple[int, str]]:
+    """Requests the links of an issue
+
+    Returns - the uid of the linked issue and the link type for every link
+    """
+    issue_gl = gl.projects.get(issue.project_id, lazy=True).issues.get(issue.iid, lazy=True)
+    return [(link.id, link.link_type) for link in issue_gl.links.list()]
+
+
+def find_deleted_issues(gl: gitlab.Gitlab, issues: dict[int, Issue], changed_issues: dict[int, Issue]) -> set[int]:
+    """Returns the uids of known issues that were deleted in Gitlab.
+
+    The full list of issues of a project is only requested if the total reported by Gitlab differs from the number of
+    known issues in that project.
+    """
+    deleted = set()
+    for p in config['projects']:
+        project = gl.projects.get(p['project_no'], lazy=True)
+        known = {uid for uid, issue in (issues | changed_issues).items() if issue.project_id == p['project_no']}
+        total = project.issues.list(iterator=True, per_page=1, scope='all').total
+        if total is None or total != len(known):
+            existing = {issue.id for issue in list_pages(project.issues, scope='all')}
+            deleted.update(known - existing)
+    return deleted
+
+
+def find_deleted_epics(gl: gitlab.Gitlab, epics: dict[int, Epic], changed_epics: dict[int, Epic]) -> set[int]:
+    """Returns the uids of known epics that were deleted in Gitlab, see find_deleted_issues"""
+    project_group = gl.groups.get(config['server']['group_no'], lazy=True)
+    known = epics.keys() | changed_epics.keys()
+    total = project_group.epics.list(iterator=True, per_page=1, scope='all').total
+    if total is not None and total == len(known):
+        return set()
+    existing = {epic.iid for epic in list_pages(project_group.epics, scope='all')}
+    return known - existing
+
+
+def parse_issue(issue) -> Issue:
+    if issue.state == 'opened':
+        s = Status.OPENED
+    else:
+        s = Status.CLOSED
+
+    if issue.iteration is None:
+        has_iteration = False
+    else:
+        has_iteration = True
+
+    return Issue(s,
+                 issue.id,
+                 issue.iid,
+                 issue.project_id,
+                 issue.epic_iid,
+                 issue.title,
+                 issue.web_url,
+                 has_iteration)
 
 
 def parse_issues(issues_from_gl) -> dict[int, Issue]:
@@ -75,29 +344,7 @@ def parse_issues(issues_from_gl) -> dict[int, Issue]:
     print(f"Parsing {len(issues_from_gl)} issues...")
     i = 0
     for issue in issues_from_gl:
-        if issue.state == 'opened':
-            s = Status.OPENED
-        else:
-            s = Status.CLOSED
-
-        if issue.iteration is None:
-            has_iteration = False
-        else:
-            has_iteration = True
-
-        issue_conv = Issue(s,
-                           issue.id,
-                           issue.iid,
-                           issue.project_id,
-                           issue.epic_iid,
-                           issue.title,
-                           issue.web_url,
-                           has_iteration)
-
-        if not issue.links.list():
-            setattr(issue_conv, 'has_no_links', True)
-
-        issue_dict[issue.id] = issue_conv
+        issue_dict[issue.id] = parse_issue(issue)
         i = i + 1
         if i == 20:
             print('.', end='')
@@ -107,8 +354,54 @@ def parse_issues(issues_from_gl) -> dict[int, Issue]:
     return issue_dict
 
 
-def parse_epics(epics_from_gl) -> dict[int, Epic]:
+def mark_issues_without_links(issues: dict[int, Issue], links: list[Link]):
+    """Sets has_no_links of every issue: True if it is neither the source nor the target of one of the links"""
+    linked = {uid for link in links for uid in (link.source_uid, link.target_uid)}
+    for uid, issue in issues.items():
+        issue.has_no_links = uid not in linked
+
+
+def parse_configured_epics(epics_from_gl, issues: dict[int, Issue]) -> dict[int, Epic]:
+    """Parses the epics and counts their issues as the backend and download.local_epic_counts of the config say"""
+    download_conf = config.get('download', {})
+    if download_conf.get('backend', 'rest') == 'graphql':
+        # the GraphQL results can't request the issues of an epic, so they are always counted locally
+        return parse_epics(epics_from_gl, issues, fetch_outside_projects=False)
+    if download_conf.get('local_epic_counts', True):
+        return parse_epics(epics_from_gl, issues)
+    return parse_epics(epics_from_gl)
+
+
+def epic_counts_need_requests() -> bool:
+    """Returns whether parse_configured_epics requests the issues of every epic instead of only counting them locally"""
+    download_conf = config.get('download', {})
+    if download_conf.get('backend', 'rest') == 'graphql':
+        return False
+    return not download_conf.get('local_epic_counts', True) or \
+        download_conf.get('epic_issues_outside_projects', False)
+
+
+def parse_epics(epics_from_gl, issues: dict[int, Issue] = None, fetch_outside_projects: bool = None) \
+        -> dict[int, Epic]:
+    """Parses the epics and counts their (closed) issues.
+
+    Arguments:
+        issues: Optional, the already parsed issues. If given, the issues of an epic are collected from the epic_id of
+            the issues in one pass instead of requesting them for every epic.
+        fetch_outside_projects: Optional. If True and issues are given, the issues of every epic are requested anyway
+            to count the ones of projects that are not configured.
+            [Default=download.epic_issues_outside_projects from the config]
+    """
     print("Parsing epics...")
+
+    if issues is not None:
+        local_issue_states = epic_issue_states(issues)
+        if fetch_outside_projects is None:
+            fetch_outside_projects = config.get('download', {}).get('epic_issues_outside_projects', False)
+    else:
+        fetch_outside_projects = False
+    configured_projects = {p['project_no'] for p in config['projects']}
+
     epics_parsed: [Epic] = []
     for epic in epics_from_gl:
         if epic.state == 'opened':
@@ -116,69 +409,106 @@ def parse_epics(epics_from_gl) -> dict[int, Epic]:
         else:
             s = Status.CLOSED
 
-        def count_closed(issue_list) -> int:
-            c = 0
-            for issue in issue_list:
-                if issue.state == 'closed':
-                    c = c + 1
-            return c
+        if issues is None:
+            issue_states = {issue.id: issue.state for issue in epic.issues.list(get_all=True)}
+        else:
+            issue_states = local_issue_states.get(epic.iid, {})
+            if fetch_outside_projects:
+                issue_states = issue_states | {issue.id: issue.state for issue in epic.issues.list(get_all=True)
+                                               if issue.project_id not in configured_projects}
+
+        epic_conv = Epic(s, epic.iid, epic.title, epic.labels, epic.description, 0, 0)
+        count_issues(epic_conv, issue_states)
+        epics_parsed.append(epic_conv)
+    return {item.uid: item for item in epics_parsed}
 
-        epic_issues = epic.issues.list(get_all=True)
 
-        n = count_closed(epic_issues)
-        m = len(epic_issues)
+def epic_issue_states(issues: dict[int, Issue]) -> dict[int, dict[int, str]]:
+    """Returns the uid and state ('opened' or 'closed') of the issues of every epic, by the epic's uid"""
+    states: dict[int, dict[int, str]] = {}
+    for issue in issues.values():
+        if issue.epic_id:
+            states.setdefault(issue.epic_id, {})[issue.uid] = 'closed' if issue.status == Status.CLOSED else 'opened'
+    return states
 
-        #print(s, epic.iid, epic.title, n, '/', m)
 
-        # if there are issues attached, get their uids
-        if n > 0:
-            issue_uids = {issue.id for issue in epic_issues}
-        else:
-            issue_uids = None
+def count_issues(epic: Epic, issue_states: dict[int, str]):
+    """Sets the issue counts and issue uids of the epic from the states of its issues, by their uid"""
+    epic.count_closed = list(issue_states.values()).count('closed')
+    epic.count_all_issues = len(issue_states)
 
-        epics_parsed.append(Epic(s, epic.iid, epic.title, epic.labels, epic.description, n, m, issue_uids))
-    return {item.uid: item for item in epics_parsed}
+    #print(epic.status, epic.uid, epic.title, epic.count_closed, '/', epic.count_all_issues)
+
+    # if there are issues attached, get their uids
+    if epic.count_closed > 0:
+        epic.issue_uids = set(issue_states.keys())
+    else:
+        epic.issue_uids = None
 
 
-def parse_links(issues_raw, issues) -> ([Link], [Link]):
+def parse_links(issues: dict[int, Issue], issue_links: dict[int, list[tuple[int, str]]]) -> ([Link], [Link]):
+    """Converts the links of the issues into related and blocking Links.
+
+    Gitlab reports every link on both of its issues, so every relation is normalized into a key: related issues as
+    (smaller uid, larger uid) and an is_blocked_by link as the blocks link of the other issue. A relation is added
+    once, when its key is seen first, the later reports are dropped as duplicates.
+    """
     print("'************\n\n************\nLinking...")
     verbose = False
     links_blocking = []
     links_related = []
 
-    for issue in issues_raw:
-        links = issue.links.list()
-        for link in links:
-            if link.link_type == 'is_blocked_by':
-                print("skip\n" if verbose else "s", end='')
-                break
-            elif link.link_type == 'blocks':
+    seen: set[tuple[int, int, Link_Type]] = set()
+    duplicates = 0
+    for issue_uid, links in issue_links.items():
+        for link_uid, link_type in links:
+            if link_type == 'relates_to':
+                key = (min(issue_uid, link_uid), max(issue_uid, link_uid), Link_Type.RELATES_TO)
+                link_conv = Link(issue_uid, link_uid, Link_Type.RELATES_TO)
+            elif link_type == 'blocks':
                 # here we have a blocker
-                link_conv = Link(issues.get(issue.id), issues.get(link.id), Link_Type.BLOCKS)
+                key = (issue_uid, link_uid, Link_Type.BLOCKS)
+                link_conv = Link(issue_uid, link_uid, Link_Type.BLOCKS)
+            elif link_type == 'is_blocked_by':
+                # the same as the blocks link reported by the other issue
+                key = (link_uid, issue_uid, Link_Type.BLOCKS)
+                link_conv = Link(link_uid, issue_uid, Link_Type.BLOCKS)
+            else:
+                print(f"Unknown link type {link_type}: {issue_uid} -> {link_uid}\n" if verbose else "?", end="")
+                continue
+
+            if key in seen:
+                duplicates += 1
+                print(f"Duplicate: {link_conv.describe(issues)}\n" if verbose else "s", end="")
+                continue
+            seen.add(key)
+
+            if link_conv.type == Link_Type.BLOCKS:
                 links_blocking.append(link_conv)
-                print(f"Added: {link_conv}\n" if verbose else ".", end="")
-
-            elif link.link_type == 'relates_to':
-                # check for duplication
-                dub = False
-                for l in links_related:
-                    if l.target is None:
-                        print(l)
-                        break
-                    if l.target.uid == issue.id:
-                        dub = True
-
-                if not dub:
-                    link_conv = Link(issues.get(issue.id), issues.get(link.id), Link_Type.RELATES_TO)
-                    links_related.append(link_conv)
-
-                print(f"Added: {link_conv}\n" if verbose else ".", end="")
+            else:
+                links_related.append(link_conv)
+            print(f"Added: {link_conv.describe(issues)}\n" if verbose else ".", end="")
+
+    print(f"\n** Parsed links: {len(links_related)} related, {len(links_blocking)} blocking, "
+          f"{duplicates} duplicates dropped **")
     return links_related, links_blocking
 
 
+def link_touches(link: Link, uids) -> bool:
+    """Returns whether the source or target of the link is one of the given issue uids"""
+    return link.source_uid in uids or link.target_uid in uids
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download and parse the epics, issues and links of the Gitlab group")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only download what changed since the last run and merge it into the previous snapshot")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     start = time.time()
-    main()
+    with instrumented(args.report, args.profile):
+        main(args.incremental)
     finish = time.time()
     time_taken = finish - start
     print(f"download.py took {time_string(time_taken)}")
@@ -0,0 +1,150 @@
+from functools import reduce
+from operator import getitem
+from types import SimpleNamespace
+from typing import Iterator
+
+import gitlab
+
+EPICS_QUERY = """
+query GroupEpics($fullPath: ID!, $first: Int, $after: String) {
+  group(fullPath: $fullPath) {
+    epics(first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes { iid title state description updatedAt labels { nodes { title } } }
+    }
+  }
+}
+"""
+
+PROJECTS_QUERY = """
+query ProjectPaths($ids: [ID!], $first: Int, $after: String) {
+  projects(ids: $ids, first: $first, after: $after) {
+    pageInfo { hasNextPage endCursor }
+    nodes { id fullPath }
+  }
+}
+"""
+
+ISSUES_QUERY = """
+query ProjectIssues($fullPath: ID!, $first: Int, $after: String) {
+  project(fullPath: $fullPath) {
+    issues(first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        id iid projectId state title webUrl updatedAt
+        iteration { id }
+        epic { iid }
+        linkedWorkItems { pageInfo { hasNextPage } nodes { linkType workItem { id } } }
+      }
+    }
+  }
+}
+"""
+
+
+class GraphQLError(Exception):
+    """Raised when the Gitlab GraphQL API answers with errors"""
+
+
+class GraphQLClient:
+    """A minimal client for the Gitlab GraphQL API, sharing the session and token of a python-gitlab client"""
+
+    def __init__(self, gl: gitlab.Gitlab, page_size: int = 100):
+        self.endpoint = f"{gl.url}/api/graphql"
+        self.session = gl.session
+        self.headers = {'Authorization': f"Bearer {gl.private_token}"}
+        self.page_size = page_size
+        self.request_count = 0
+
+    def query(self, query: str, **variables) -> dict:
+        """Sends one query and returns its data"""
+        operation_name = query.split()[1].split('(')[0]
+        response = self.session.post(self.endpoint, headers=self.headers,
+                                     json={'query': query, 'operationName': operation_name, 'variables': variables})
+        self.request_count += 1
+        response.raise_for_status()
+        body = response.json()
+        if body.get('errors'):
+            raise GraphQLError(body['errors'])
+        return body['data']
+
+    def paginate(self, query: str, path: list[str], **variables) -> Iterator[dict]:
+        """Yields the nodes of the connection at the given path of the query's data, page by page
+
+        Arguments:
+            path: The keys leading from the query's data to the paginated connection, e.g. ['group', 'epics']
+        """
+        cursor = None
+        while True:
+            data = self.query(query, first=self.page_size, after=cursor, **variables)
+            connection = reduce(getitem, path, data)
+            yield from connection['nodes']
+            if not connection['pageInfo']['hasNextPage']:
+                break
+            cursor = connection['pageInfo']['endCursor']
+
+
+def global_id_to_int(global_id: str) -> int:
+    """Converts a global id like gid://gitlab/Issue/123 to the numeric id used by the REST API"""
+    return int(global_id.rsplit('/', 1)[-1])
+
+
+def download_graphql(gl: gitlab.Gitlab, group_no: int, projects_conf: list[dict], page_size: int = 100):
+    """Downloads the epics of the group and the issues of the configured projects together with their links
+    using batched GraphQL queries.
+
+    The results carry the same attributes as the python-gitlab objects used by the parse functions, so they can
+    be parsed the same way.
+
+    Returns - a tuple of the epics, the issues and the links of each issue by the issue's uid, as tuples of the linked
+    issue's uid and the link type
+    """
+    client = GraphQLClient(gl, page_size)
+
+    # The GraphQL API addresses groups and projects by their path
+    group_path = gl.groups.get(group_no).full_path
+    project_ids = [f"gid://gitlab/Project/{p['project_no']}" for p in projects_conf]
+    project_paths = {global_id_to_int(p['id']): p['fullPath']
+                     for p in client.paginate(PROJECTS_QUERY, ['projects'], ids=project_ids)}
+    # like the REST API, which answers 404, a configured project that is missing or not accessible is an error
+    missing = [f"{p['name']} ({p['project_no']})" for p in projects_conf if p['project_no'] not in project_paths]
+    if missing:
+        raise GraphQLError(f"Projects not found or not accessible: {', '.join(missing)}")
+
+    epics_raw = [SimpleNamespace(iid=int(e['iid']),
+                                 title=e['title'],
+                                 state=e['state'],
+                                 labels=[label['title'] for label in e['labels']['nodes']],
+                                 description=e['description'],
+                                 updated_at=e['updatedAt'])
+                 for e in client.paginate(EPICS_QUERY, ['group', 'epics'], fullPath=group_path)]
+    print("** Epics in group: ({n}) **".format(n=len(epics_raw)))
+
+    issues_raw = []
+    issue_links: dict[int, list[tuple[int, str]]] = {}
+    truncated = 0
+    for p in projects_conf:
+        count = 0
+        nodes = client.paginate(ISSUES_QUERY, ['project', 'issues'], fullPath=project_paths[p['project_no']])
+        for i in nodes:
+            issue = SimpleNamespace(id=global_id_to_int(i['id']),
+                                    iid=int(i['iid']),
+                                    project_id=i['projectId'],
+                                    epic_iid=int(i['epic']['iid']) if i['epic'] else None,
+                                    state=i['state'],
+                                    title=i['title'],
+                                    web_url=i['webUrl'],
+                                    iteration=i['iteration'],
+                                    updated_at=i['updatedAt'])
+            issues_raw.append(issue)
+            issue_links[issue.id] = [(global_id_to_int(link['workItem']['id']), link['linkType'])
+                                     for link in i['linkedWorkItems']['nodes']]
+            if i['linkedWorkItems']['pageInfo']['hasNextPage']:
+                truncated += 1
+            count += 1
+        print(f"** Issues {p['name']}: ({count}) **")
+
+    if truncated:
+        print(f"Warning: {truncated} issues have more linked items than fit in one page, some links are missing")
+    print(f"** GraphQL: {client.request_count} requests **")
+    return epics_raw, issues_raw, issue_links
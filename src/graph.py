@@ -1,5 +1,29 @@
+import re
+from collections import deque
+
 from model.classes import Epic
-from src.utils import dict_string
+from src.utils import DisjointSet
+
+# The relations in the order they are checked, a line mentioning more than one uses the first one of this list
+RELATIONS = ['previous', 'next', 'include', 'related']
+RELATION_PATTERN = re.compile('|'.join(RELATIONS))
+# The epic id is the last part of an epic's url, a trailing + comes from Gitlab's rich references
+EPIC_URL_PATTERN = re.compile(r'https:\S*/(\d+)\+?(?!\S)')
+
+
+def parse_relations(description: str) -> [tuple[str, int]]:
+    """Finds the relations in an epic description, see render_epic_relationships for the syntax.
+
+    Returns - a list of tuples of the relation and the uid of the target epic
+    """
+    relations = []
+    for line in description.splitlines():
+        mentioned = set(RELATION_PATTERN.findall(line))
+        if not mentioned:
+            continue
+        relation = next(r for r in RELATIONS if r in mentioned)
+        relations.extend((relation, int(uid)) for uid in EPIC_URL_PATTERN.findall(line))
+    return relations
 
 
 class EpicGraph:
@@ -10,13 +34,14 @@ class EpicGraph:
         self.epics: dict[int, Epic] = {}
         for k, epic in enumerate(epics.values()):
             self.epics[k] = epic
+        self.graph_ids: dict[int, int] = {epic.uid: k for k, epic in self.epics.items()}  # uid -> graph_id
 
         # Graph relations
-        self.next: dict[int, list[int]] = {}
-        self.previous: dict[int, list[int]] = {}
-        self.related: dict[int, list[int]] = {}
-        self.includes: dict[int, list[int]] = {}
-        self.includedBy: dict[int, list[int]] = {}
+        self.next: dict[int, set[int]] = {}
+        self.previous: dict[int, set[int]] = {}
+        self.related: dict[int, set[int]] = {}
+        self.includes: dict[int, set[int]] = {}
+        self.includedBy: dict[int, set[int]] = {}
         # Tree properties
         self.node_heights: dict[int, int] = {}  # Largest Distance from a root node, as a node may have multiple roots
         self.node_parents: dict[int, int] = {}  # Direct parent node
@@ -25,31 +50,19 @@ class EpicGraph:
         self.analyze_graph()
         self.swap_related_trees()
 
-        # print("Nodes:\n", dict_string(self.epics, padding=4), "\n----")
-        # print("Next:\n", dict_string(self.next, padding=4, include_falsy=False), "\n----")
-        # print("Previous:\n", dict_string(self.previous, padding=4, include_falsy=False), "\n----")
-        # print("Related:\n", dict_string(self.related, padding=4, include_falsy=False), "\n----")
-        # print("Included:\n", dict_string(self.includes, padding=4, include_falsy=False), "\n----")
-        # print("IncludedBy:\n", dict_string(self.includedBy, padding=4, include_falsy=False), "\n----")
-
     def __len__(self):
         return self.length
 
     def find_epic_with_epic_id(self, epic_id: int) -> Epic:
         """This returns the epic that belongs to the given epic_id"""
 
-        for k, v in self.epics.items():
-            if v.uid == epic_id:
-                return v
-        return None
+        graph_id = self.graph_ids.get(epic_id)
+        return self.epics[graph_id] if graph_id is not None else None
 
-    def find_graph_id_with_epic_id(self, epic_id: int) -> Epic:
+    def find_graph_id_with_epic_id(self, epic_id: int) -> int:
         """This returns the graph_id where the epic with the given epic_id can be found"""
 
-        for k, v in self.epics.items():
-            if v.uid is epic_id:
-                return k
-        return None
+        return self.graph_ids.get(epic_id)
 
     def analyze_graph(self):
         """Analyse the epics in regard to their relationships and the height and width of the tree subgraph they
@@ -57,61 +70,99 @@ class EpicGraph:
         """
 
         for k in range(len(self)):
-            self.next[k] = []
-            self.previous[k] = []
-            self.includes[k] = []
-            self.includedBy[k] = []
-            self.related[k] = []
+            self.next[k] = set()
+            self.previous[k] = set()
+            self.includes[k] = set()
+            self.includedBy[k] = set()
+            self.related[k] = set()
 
         for n, epic in self.epics.items():
 
             # analyze the description to find links
-            if epic.description:
-                lines = epic.description.splitlines()
-                for line in lines:
-                    if 'previous' in line \
-                            or 'next' in line \
-                            or 'include' in line \
-                            or 'related' in line:
-                        target_epic_id = None
-                        for t in line.split():
-                            if 'https:' in t:
-                                target_epic_id = int(t.split('/')[-1].rstrip('+'))
-                                target_graph_id = self.find_graph_id_with_epic_id(target_epic_id)
-                            else:
-                                continue
-                            if target_graph_id:
-                                # next and previous connections as directed edges
-                                if 'previous' in line:
-                                    if target_graph_id not in self.previous[n]:
-                                        self.previous[n].append(target_graph_id)
-                                    if n not in self.next[target_graph_id]:
-                                        self.next[target_graph_id].append(n)
-                                elif 'next' in line:
-                                    if target_graph_id not in self.next[n]:
-                                        self.next[n].append(target_graph_id)
-                                    if n not in self.previous[target_graph_id]:
-                                        self.previous[target_graph_id].append(n)
-                                # includes as directed edges
-                                elif 'include' in line:
-                                    self.includes[n].append(target_graph_id)
-                                    self.includedBy[target_graph_id].append(n)
-                                # related as undirected edges
-                                elif 'related' in line:
-                                    self.related[n].append(target_graph_id)
-                                    if n not in self.related[target_graph_id]:
-                                        self.related[target_graph_id].append(n)
-                                else:
-                                    raise ValueError(
-                                        f"An epic description has a target id but no valid relation. {epic.uid} -> {target_epic_id}")
-
-        for i in range(len(self)):
-            self.node_heights[i] = self.get_height(i)
-            self.tree_widths[i] = self.get_width(i)
+            if not epic.description:
+                continue
+            for relation, target_epic_id in parse_relations(epic.description):
+                target_graph_id = self.find_graph_id_with_epic_id(target_epic_id)
+                if target_graph_id is None:
+                    continue
+                # next and previous connections as directed edges
+                if relation == 'previous':
+                    self.previous[n].add(target_graph_id)
+                    self.next[target_graph_id].add(n)
+                elif relation == 'next':
+                    self.next[n].add(target_graph_id)
+                    self.previous[target_graph_id].add(n)
+                # includes as directed edges
+                elif relation == 'include':
+                    self.includes[n].add(target_graph_id)
+                    self.includedBy[target_graph_id].add(n)
+                # related as undirected edges
+                elif relation == 'related':
+                    self.related[n].add(target_graph_id)
+                    self.related[target_graph_id].add(n)
+
+        self.analyze_trees()
+
+    def analyze_trees(self):
+        """Determines the height, parent and tree width of every node in one pass over the nodes in topological
+        order (Kahn's algorithm).
+
+        A node's parent is the previous or including node with the largest height, the one with the smallest graph_id
+        if there are several. The width of a node is the sum of the widths of the nodes it is the parent of, or 1 for
+        a leaf. A node shared by several previous or including nodes is only counted for its parent.
+
+        Nodes on a cycle of relations have no topological order. When only those are left, the one with the smallest
+        graph_id is placed as if the edges from the remaining nodes didn't exist, which breaks the cycle.
+        """
+
+        parents: dict[int, set[int]] = {k: self.previous[k] | self.includedBy[k] for k in range(len(self))}
+        waiting_for = {k: len(nodes) for k, nodes in parents.items()}
+        ready = deque(k for k, count in waiting_for.items() if count == 0)
+        order: list[int] = []
+        cycle_nodes: list[int] = []
+
+        while len(order) < len(self):
+            if not ready:
+                # Everything left is on or behind a cycle
+                node = min(k for k, count in waiting_for.items() if count > 0)
+                cycle_nodes.append(node)
+            else:
+                node = ready.popleft()
+            waiting_for[node] = -1  # placed
+
+            placed_parents = [p for p in parents[node] if waiting_for[p] == -1 and p != node]
+            if placed_parents:
+                parent = min(placed_parents, key=lambda p: (-self.node_heights[p], p))
+                self.node_heights[node] = self.node_heights[parent] + 1
+                self.node_parents[node] = parent
+            else:
+                self.node_heights[node] = 0
+                self.node_parents[node] = node
+            order.append(node)
+
+            for child in self.next[node] | self.includes[node]:
+                if waiting_for[child] > 0:
+                    waiting_for[child] -= 1
+                    if waiting_for[child] == 0:
+                        ready.append(child)
+
+        # Parents come before their children in the order, also on cycles
+        for node in reversed(order):
+            widths = [self.tree_widths[child] for child in self.next[node] | self.includes[node]
+                      if child != node and self.node_parents[child] == node]
+            self.tree_widths[node] = sum(widths) if widths else 1
+
+        if cycle_nodes:
+            print(f"Warning: the relations between epics form cycles, they are broken at the epics "
+                  f"{', '.join(str(self.epics[k].uid) for k in cycle_nodes)}")
 
     def swap_related_trees(self):
         """A heuristic that checks whether any two trees are related to each other, and swaps them with unrelated
-        trees to have related ones closer to each other """
+        trees to have related ones closer to each other.
+
+        The roots of each group of related trees are moved one by one behind the group's first root, a swap at a time.
+        The swaps are only played through on a list of positions and then applied to the graph at once.
+        """
 
         roots = self.get_roots()
         trees = []
@@ -119,103 +170,43 @@ class EpicGraph:
             trees.append(self.get_tree(root))
         related_roots = self.get_related_tree_roots(trees)
         related_roots.sort()
+
+        order = list(range(len(self)))  # order[graph_id] = the graph_id that ends up there
+        group_members = [set(roots) for roots in related_roots]
+        group_of = {root: i for i, roots in enumerate(related_roots) for root in roots}
         for i in range(len(related_roots)):
-            roots = related_roots[i]
+            roots = sorted(group_members[i])
             a = roots[0]
             for j, b in enumerate(roots[1:]):
                 new_index = a + 1 + j
-                self.swap_graph_ids(new_index, b)  # Put b next to a
-
-                related_roots[i][j + 1] = new_index  # update references
-                for k in range(i + 1, len(related_roots)):
-                    if new_index in related_roots[k]:
-                        related_roots[k].remove(new_index)
-                        related_roots[k].append(b)
-                        related_roots[k].sort()
-
-    def get_height(self, node_id):
-        """Recursively determine the height and parent of the given node.
-
-        If a node has multiple parents the one with the largest height will be chosen
-
-        Returns - the height of the given node_id
-        """
-
-        if node_id in self.node_heights.keys():
-            return self.node_heights[node_id]
-
-        prev_nodes = [prev_node for prev_node in self.previous[node_id] if prev_node is not None]
-        prev_nodes.extend([including_node for including_node in self.includedBy[node_id] if including_node is not None])
-
-        if not prev_nodes:
-            self.node_heights[node_id] = 0
-            self.node_parents[node_id] = node_id
-            return 0
-
-        prev_nodes.sort(key=lambda n: self.get_height(n), reverse=True)
-        self.node_heights[node_id] = 1 + self.get_height(prev_nodes[0])
-        self.node_parents[node_id] = prev_nodes[0]
-
-        return self.node_heights[node_id]
-
-    def get_width(self, node_id):
-        """Recursively determines the width of a tree, with node_id as its root,
-        by adding the widths of its child subtrees
-
-        Returns - the width of the given node_id
-        """
-
-        if node_id in self.tree_widths.keys():
-            return self.tree_widths[node_id]
-
-        next_nodes = [next_node for next_node in self.next[node_id] if next_node is not None]
-        next_nodes.extend([included_node for included_node in self.includes[node_id] if included_node is not None])
-
-        if not next_nodes:
-            self.tree_widths[node_id] = 1
-            return 1
+                if new_index == b:
+                    continue
+                order[new_index], order[b] = order[b], order[new_index]  # Put b next to a
 
-        # uncomment when script crashes because of maximum recursion depth is exceeded
-        # print("epic id:", self.epics[node_id].uid)
+                # update references of the groups that come later, the root that was at new_index is now at b
+                k = group_of.get(new_index)
+                if k is not None and k > i:
+                    group_members[k].remove(new_index)
+                    group_members[k].add(b)
+                    group_of[b] = k
+                group_of[new_index] = i
 
-        self.tree_widths[node_id] = sum([self.get_width(node) for node in next_nodes])
-        return self.tree_widths[node_id]
+        self.reorder(order)
 
-    def swap_graph_ids(self, a: int, b: int):
-        """Swaps the nodes with the ids a and b"""
+    def reorder(self, order: list[int]):
+        """Gives every node a new graph_id, the node with the graph_id order[k] gets the graph_id k"""
 
-        self.epics[b], self.epics[a] = self.epics[a], self.epics[b]
-        self.node_heights[b], self.node_heights[a] = self.node_heights[a], self.node_heights[b]
-        self.tree_widths[b], self.tree_widths[a] = self.tree_widths[a], self.tree_widths[b]
+        new_ids = {old: new for new, old in enumerate(order)}
 
-        list_dicts: list[dict[int, list[int]]] = [self.next, self.previous, self.related,
-                                                  self.includes, self.includedBy]
-        int_dicts: list[dict[int, int]] = [self.node_parents]
+        self.epics = {new: self.epics[old] for new, old in enumerate(order)}
+        self.graph_ids = {epic.uid: k for k, epic in self.epics.items()}
+        self.node_heights = {new_ids[k]: v for k, v in self.node_heights.items()}
+        self.tree_widths = {new_ids[k]: v for k, v in self.tree_widths.items()}
+        self.node_parents = {new_ids[k]: new_ids[v] for k, v in self.node_parents.items()}
 
-        for dictionary in list_dicts:
-            # swap lists
-            dictionary[b], dictionary[a] = dictionary[a], dictionary[b]
-            # update all references
-            for k, v in dictionary.items():
-                if a in v and b in v:
-                    continue
-                elif a in v:
-                    v.remove(a)
-                    v.append(b)
-                elif b in v:
-                    v.remove(b)
-                    v.append(a)
-
-        for dictionary in int_dicts:
-            # swap lists
-            dictionary[b], dictionary[a] = dictionary[a], dictionary[b]
-
-            # update all references
-            for k, v in dictionary.items():
-                if v == a:
-                    dictionary[k] = b
-                elif v == b:
-                    dictionary[k] = a
+        for name in ['next', 'previous', 'related', 'includes', 'includedBy']:
+            relation: dict[int, set[int]] = getattr(self, name)
+            setattr(self, name, {new_ids[k]: {new_ids[node] for node in nodes} for k, nodes in relation.items()})
 
     def get_roots(self) -> [int]:
         """Returns all roots in the graph.
@@ -254,54 +245,35 @@ class EpicGraph:
         return orphans
 
     def get_tree(self, root: int) -> [int]:
-        """Recursively returns a list of nodes that are part of the given root's tree
-        using the next and includes relationships. The root is always the first element of the list"""
+        """Returns a list of nodes that are part of the given root's tree using the next and includes relationships.
+        Every node is listed once, even if it can be reached on several paths. The root is always the first element
+        of the list"""
 
         linked_nodes = [root]
-        for next in self.next[root]:
-            linked_nodes.extend(self.get_tree(next))
-        for included in self.includes[root]:
-            linked_nodes.extend(self.get_tree(included))
+        visited = {root}
+        for node in linked_nodes:
+            for child in self.next[node] | self.includes[node]:
+                if child not in visited:
+                    visited.add(child)
+                    linked_nodes.append(child)
         return linked_nodes
 
     def get_related_tree_roots(self, trees: list[list[int]]) -> list[list[int]]:
-        """Given a list of trees, this function returns a list of pairs of the trees' roots,
-        if those trees' nodes are related through any relation."""
-        related_trees: list[tuple[int, int]] = []
-        for i in range(0, len(trees) - 1):
-            related_nodes = [self.related[node] for node in trees[i]]
-            related_nodes.extend([self.includes[node] for node in trees[i]])
-            related_nodes.extend([self.includedBy[node] for node in trees[i]])
-            related_nodes.extend([self.next[node] for node in trees[i]])
-            related_nodes.extend([self.previous[node] for node in trees[i]])
-
-            related_nodes = [node for nodes in related_nodes for node in nodes]  # Flattens the list
-            for j in range(i + 1, len(trees)):
-                for node in related_nodes:
-                    if node in trees[j]:
-                        related_trees.append((i, j))
-                        break
-
-        related_tree_roots: list[set[int]] = [{trees[i][0], trees[j][0]} for (i, j) in related_trees]
-        delete_later = []
-        for i in range(0, len(related_tree_roots) - 1):
-            if i in delete_later:
-                continue
-            delete_later_len = -1
-            while (len(delete_later) != delete_later_len):  # Continue until all related trees were found
-                delete_later_len = len(delete_later)
-                for j in range(i + 1, len(related_tree_roots)):
-                    if j in delete_later:
-                        continue
-                    if related_tree_roots[i].intersection(related_tree_roots[j]):
-                        related_tree_roots[i] = related_tree_roots[i].union(related_tree_roots[j])
-                        delete_later.append(j)
-
-        delete_later.sort(reverse=True)
-        for i in delete_later:
-            del related_tree_roots[i]
-
-        related_roots_list = [list(roots) for roots in related_tree_roots]
-        for root_list in related_roots_list:
-            root_list.sort()
-        return related_roots_list
+        """Given a list of trees, this function returns the roots of the trees grouped by whether the trees' nodes
+        are related through any relation, directly or through other trees. Trees without relations to other trees
+        are left out."""
+
+        trees_of_node: dict[int, list[int]] = {}
+        for i, tree in enumerate(trees):
+            for node in tree:
+                trees_of_node.setdefault(node, []).append(i)
+
+        related_trees = DisjointSet(len(trees))
+        for i, tree in enumerate(trees):
+            for node in tree:
+                for relation in (self.related, self.includes, self.includedBy, self.next, self.previous):
+                    for related_node in relation[node]:
+                        for j in trees_of_node.get(related_node, []):
+                            related_trees.union(i, j)
+
+        return [sorted(trees[i][0] for i in group) for group in related_trees.groups() if len(group) > 1]
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from src.disk_lru import DiskLRU
+
+# Headers that describe the transfer of a body and not the body itself
+TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+
+class CachingAdapter(BaseAdapter):
+    """A transport adapter for requests that keeps GET responses on disk together with their ETag and
+    Last-Modified headers. Cached responses are revalidated with conditional requests and a 304 is answered
+    with the body from disk.
+
+    Arguments:
+        directory: The directory the responses are stored in.
+        max_size: Optional maximum size of the cache in bytes. The least recently used responses are evicted
+            once it is exceeded. [Default=200MB]
+        inner: Optional adapter that actually sends the requests. [Default=HTTPAdapter()]
+    """
+
+    def __init__(self, directory, max_size: int = 200 * 1024 * 1024, inner: BaseAdapter = None):
+        super().__init__()
+        self.files = DiskLRU(directory, max_size)
+        self.inner = inner if inner is not None else HTTPAdapter()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_from_cache = 0
+        self._lock = threading.Lock()
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != 'GET' or kwargs.get('stream'):
+            return self.inner.send(request, **kwargs)
+
+        key = self.key(request)
+        entry = self.load(key)
+        if entry is not None:
+            if 'etag' in entry['headers']:
+                request.headers['If-None-Match'] = entry['headers']['etag']
+            if 'last-modified' in entry['headers']:
+                request.headers['If-Modified-Since'] = entry['headers']['last-modified']
+
+        response = self.inner.send(request, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.hits += 1
+                self.bytes_from_cache += len(entry['body'])
+            return self.cached_response(request, response, entry)
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200 and ('etag' in response.headers or 'last-modified' in response.headers):
+            self.store(key, response)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+    def key(self, request: requests.PreparedRequest) -> str:
+        """The cache key of a request. It includes the token, so users with different permissions don't share
+        responses, but only as part of a hash."""
+        token = request.headers.get('PRIVATE-TOKEN') or request.headers.get('Authorization') or ''
+        return hashlib.sha256(f"{request.url}\n{token}".encode()).hexdigest()
+
+    def load(self, key: str) -> dict:
+        try:
+            meta = json.loads(self.files.path(key, '.json').read_text())
+            body = self.files.path(key, '.body').read_bytes()
+            self.files.touch(key, '.json')
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return meta | {'body': body}
+
+    def store(self, key: str, response: requests.Response):
+        headers = {k.lower(): v for k, v in response.headers.items() if k.lower() not in TRANSFER_HEADERS}
+        meta = json.dumps({'url': response.url, 'headers': headers}).encode()
+        # the body first, a reader only finds the entry once its metadata is there
+        self.files.write(key, {'.body': response.content, '.json': meta})
+
+    def cached_response(self, request: requests.PreparedRequest, not_modified: requests.Response,
+                        entry: dict) -> requests.Response:
+        """Builds a 200 response from a cached entry, updated with the headers of the 304 response. Its network_bytes
+        are the size of the 304 response."""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers.update({k: v for k, v in not_modified.headers.items() if k.lower() not in TRANSFER_HEADERS})
+        response._content = entry['body']
+        response.url = entry['url']
+        response.request = request
+        response.connection = self
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        # the instrumentation counts the body as a cache hit, only the 304 went over the network
+        response.network_bytes = len(not_modified.content or b'')
+        not_modified.close()
+        return response
+
+    def summary(self) -> str:
+        requests_total = self.hits + self.misses
+        hit_rate = self.hits / requests_total * 100 if requests_total else 0
+        return (f"** HTTP cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hits), "
+                f"{self.bytes_from_cache / 1024 / 1024:.1f}MB served from disk, "
+                f"{self.files.size / 1024 / 1024:.1f}MB cached **")
@@ -0,0 +1,210 @@
+import argparse
+import cProfile
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from src.utils import time_string
+
+# Numbers in the path of a request are ids, the endpoint is the path without them
+ID_PATTERN = re.compile(r'/\d+(?=/|$)')
+OPERATION_PATTERN = re.compile(rb'"operationName":\s*"(\w+)"')
+
+
+def endpoint(request: requests.PreparedRequest) -> str:
+    """The endpoint of a request, like 'GET /projects/:id/issues/:id/links' or 'POST /graphql ProjectIssues'"""
+    path = ID_PATTERN.sub('/:id', urlparse(request.url).path.removeprefix('/api/v4').removeprefix('/api'))
+    name = f"{request.method} {path}"
+    if isinstance(request.body, bytes):
+        operation = OPERATION_PATTERN.search(request.body)
+        if operation:
+            name += f" {operation[1].decode()}"
+    return name
+
+
+class Instrumentation:
+    """Records the phases of a run: the wall time of each, the HTTP requests and bytes received during it and, if
+    memory is traced, the peak of the memory allocated by Python while it runs.
+
+    The requests and bytes are the ones that went over the network. A response answered from the HTTP cache is
+    counted as a cache hit with the size of the cached body. Its revalidation still counts as a request, with the
+    bytes of the 304 response.
+
+    Phases can be nested and run in several threads at once. The requests and the memory peak of a phase include
+    everything that happened during it, also in other threads, so overlapping phases share them. The requests are
+    also counted per endpoint, which is exact.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: list[dict] = []
+        self.requests = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_bytes = 0
+        self.endpoints: dict[str, dict] = {}
+        self._open: list[dict] = []  # the phases running right now, in all threads
+        self._lock = threading.Lock()
+        self._profiles: list[cProfile.Profile] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[dict]:
+        """Records the code run in the with block as phase with the given name"""
+        with self._lock:
+            peak = self._update_peaks()
+            record = dict(name=name, thread=threading.current_thread().name,
+                          start=time.perf_counter() - self.started, requests=self.requests, bytes=self.bytes,
+                          cache_hits=self.cache_hits, cache_bytes=self.cache_bytes, peak=peak)
+            self._open.append(record)
+        try:
+            yield record
+        finally:
+            with self._lock:
+                self._update_peaks()
+                self._open.remove(record)
+                record['seconds'] = time.perf_counter() - self.started - record['start']
+                record['requests'] = self.requests - record['requests']
+                record['bytes'] = self.bytes - record['bytes']
+                record['cache_hits'] = self.cache_hits - record['cache_hits']
+                record['cache_bytes'] = self.cache_bytes - record['cache_bytes']
+                record['peak_mb'] = record.pop('peak') / 1024 / 1024 if tracemalloc.is_tracing() else None
+                self.phases.append(record)
+
+    def _update_peaks(self) -> int:
+        """Adds the memory peak since the last call to the open phases and starts measuring the next peak
+
+        Returns - the memory allocated right now
+        """
+        if not tracemalloc.is_tracing():
+            return 0
+        current, peak = tracemalloc.get_traced_memory()
+        for record in self._open:
+            record['peak'] = max(record['peak'], peak)
+        tracemalloc.reset_peak()
+        return current
+
+    # HTTP
+
+    def install(self, session: requests.Session):
+        """Counts the requests sent with the session"""
+        session.hooks['response'].append(self.count_response)
+
+    def count_response(self, response: requests.Response, *args, **kwargs):
+        # set by CachingAdapter on the responses it builds from the cache
+        network_bytes = getattr(response, 'network_bytes', None)
+        if network_bytes is not None:
+            size, cached = network_bytes, len(response.content)
+        else:
+            length = response.headers.get('Content-Length')
+            size, cached = int(length) if length is not None else len(response.content or b''), None
+        name = endpoint(response.request)
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+            counts = self.endpoints.setdefault(name, dict(requests=0, bytes=0, cache_hits=0, cache_bytes=0,
+                                                          seconds=0.0))
+            counts['requests'] += 1
+            counts['bytes'] += size
+            counts['seconds'] += response.elapsed.total_seconds()
+            if cached is not None:
+                self.cache_hits += 1
+                self.cache_bytes += cached
+                counts['cache_hits'] += 1
+                counts['cache_bytes'] += cached
+
+    # Profiling
+
+    def profile(self):
+        """Profiles the calling thread and every thread started afterwards with cProfile"""
+        threading.setprofile(self._profile_thread)
+        profile = cProfile.Profile()
+        self._profiles.append(profile)
+        profile.enable()
+
+    def _profile_thread(self, *args):
+        # runs on the first event of a new thread and replaces itself with a profiler for the thread
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def write_profile(self, path):
+        """Writes the merged profiles of all threads in the pstats format, for snakeviz, flameprof or gprof2dot"""
+        threading.setprofile(None)
+        for profile in self._profiles:
+            profile.disable()
+        stats = pstats.Stats(*self._profiles)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        print(f"** Profile written to {path} **")
+
+    # Reports
+
+    def report(self) -> dict:
+        return dict(seconds=time.perf_counter() - self.started,
+                    requests=self.requests,
+                    bytes=self.bytes,
+                    cache_hits=self.cache_hits,
+                    cache_bytes=self.cache_bytes,
+                    memory_traced=tracemalloc.is_tracing(),
+                    phases=sorted(self.phases, key=lambda p: p['start']),
+                    endpoints=dict(sorted(self.endpoints.items(), key=lambda e: -e[1]['requests'])))
+
+    def write_report(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(self.report(), indent=2))
+        print(f"** Report written to {path} **")
+
+    def summary(self) -> str:
+        """The phases with their time, requests, bytes, cache hits and memory peak, one per line in the order they
+        started"""
+        lines = [f"{'phase':<44} {'time':>14} {'requests':>9} {'MB':>9} {'cached':>7} {'peak MB':>8}"]
+        for p in sorted(self.phases, key=lambda p: p['start']):
+            peak = f"{p['peak_mb']:.1f}" if p['peak_mb'] is not None else '-'
+            lines.append(f"{p['name']:<44} {time_string(p['seconds']):>14} {p['requests']:>9} "
+                         f"{p['bytes'] / 1024 / 1024:>9.2f} {p['cache_hits']:>7} {peak:>8}")
+        return '\n'.join(lines)
+
+
+instrumentation = Instrumentation()
+phase = instrumentation.phase
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--report', metavar='PATH',
+                        help="write the time, HTTP requests and memory peak of every phase as JSON to PATH")
+    parser.add_argument('--profile', metavar='PATH', help="profile the run with cProfile and write the stats to PATH")
+
+
+@contextmanager
+def instrumented(report: Optional[str] = None, profile: Optional[str] = None):
+    """Traces the memory while a report is requested, profiles if a profile is requested and writes both at the end.
+
+    Arguments:
+        report: Optional path of the JSON report. [Default=no report, the memory is not traced]
+        profile: Optional path of the cProfile stats. [Default=no profiling]
+    """
+    if report:
+        tracemalloc.start()
+    if profile:
+        instrumentation.profile()
+    try:
+        yield instrumentation
+    finally:
+        if profile:
+            instrumentation.write_profile(profile)
+        if report:
+            print(instrumentation.summary())
+            instrumentation.write_report(report)
+            tracemalloc.stop()
@@ -0,0 +1,74 @@
+import queue
+import threading
+from typing import Iterator
+
+import gitlab
+from gitlab.base import RESTManager, RESTObject
+
+_DONE = object()
+
+
+def list_all(manager: RESTManager, per_page: int = 100, prefetch: int = 2, **filters) -> Iterator[RESTObject]:
+    """Lists all objects of a python-gitlab manager like manager.list(iterator=True), but requests the pages ahead.
+
+    The lists are paged with offset pagination, Gitlab's REST API doesn't offer keyset pagination for the issues of a
+    project or the epics of a group. The next page is requested by following the Link header of the response.
+
+    The pages are requested on a background thread while the caller works through the objects of the earlier ones.
+    At most prefetch pages wait in a queue, so a slow caller holds up the requests instead of collecting the whole
+    list in memory.
+
+    Arguments:
+        per_page: Optional number of objects per page. [Default=100]
+        prefetch: Optional number of pages requested ahead of the caller. [Default=2]
+    """
+    pages: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        """Puts the item into the queue unless the caller stopped listing meanwhile"""
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch():
+        try:
+            for page in request_pages(manager, per_page, **filters):
+                if not put(page):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=fetch, name=f"pages {manager.path}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                return
+            if isinstance(page, BaseException):
+                raise page
+            for data in page:
+                yield manager._obj_cls(manager, data, created_from_list=True)
+    finally:
+        stopped.set()
+
+
+def request_pages(manager: RESTManager, per_page: int, **query) -> Iterator[list[dict]]:
+    """Requests the pages of a list endpoint one after another, see list_all
+
+    Returns - the JSON objects of every page
+    """
+    gl: gitlab.Gitlab = manager.gitlab
+    response = gl.http_request('get', manager.path, query_data=dict(query, per_page=per_page))
+    while True:
+        yield response.json()
+        next_url = response.links.get('next', {}).get('url')
+        if not next_url:
+            return
+        response = gl.http_request('get', next_url)
@@ -1,13 +1,22 @@
+import argparse
+import re
+import subprocess
 import tomllib
 import graphviz
-import pickle
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cache
 from pathlib import Path
+from typing import Callable, Optional
 import time
 
 import mock.data
-from model.classes import Issue, RelatedList, BlockList, Status, Epic
-from src.utils import time_string
+from model.classes import Issue, Link, RelatedList, BlockList, Status, Epic, Link_Type
+from src.dot import DotWriter
+from src.utils import DisjointSet, time_string
 from src.graph import EpicGraph
+from src.instrument import add_arguments, instrumented, phase
+from src.render_cache import RenderCache
+from src.store import Snapshot, SnapshotIndex
 
 weight_epics = '30'
 weight_relations = '10'
@@ -16,6 +25,13 @@ opened_only = False
 
 test = False
 
+render_cache: RenderCache = None
+
+RENDERS = Path("../renders")
+
+# Issues without epic and links are connected to this node, so they are drawn together
+NO_LINK_NODE = "Kein Link oder Epic"
+
 if not test:
     with open("../settings/config.toml", mode="rb") as filehandle:
         config = tomllib.load(filehandle)
@@ -24,53 +40,215 @@ else:
         config = tomllib.load(filehandle)
 
 
-def main():
+def main(targets: list[str] = None, jobs: int = None):
+    """Renders the given targets, or all of them, with up to jobs renders at the same time
+
+    Arguments:
+        targets: Optional names of the graphs to render, see TARGETS. [Default=all]
+        jobs: Optional number of graphs that are rendered in parallel. [Default=render.jobs of the config]
+    """
+    global render_cache
+    RENDERS.mkdir(parents=True, exist_ok=True)
+    render_config = config.get('render', {})
+    targets = targets or list(TARGETS)
+    jobs = jobs or render_config.get('jobs', 4)
+    if render_config.get('cache', True):
+        render_cache = RenderCache(render_config.get('cache_dir', "../cache/renders"),
+                                   render_config.get('cache_size_mb', 100) * 1024 * 1024)
+
     if not test:
-        print("Read the pickles...")
-        issues: dict[int, Issue] = pickle.load(open("../pickles/issues_conv.p", 'rb'))
-        epics: dict[int, Epic] = pickle.load(open("../pickles/epics_conv.p", 'rb'))
-        links_related: RelatedList = pickle.load(open("../pickles/links_related.p", 'rb'))
-        links_blocking: BlockList = pickle.load(open("../pickles/links_blocking.p", 'rb'))
+        print("Open the snapshot...")
+        with Snapshot() as snapshot, phase('render.load'):
+            data = load_render_data(snapshot, targets)
     else:
-        issues = mock.data.get_issues()
-        epics = mock.data.get_epics()
+        data = dict(issues=mock.data.get_issues(), epics=mock.data.get_epics())
+        links = mock.data.get_links()
+        data['links_related'] = [link for link in links if link.type == Link_Type.RELATES_TO]
+        data['links_blocking'] = [link for link in links if link.type == Link_Type.BLOCKS]
+    if CLUSTER_TARGETS.intersection(targets):
+        # sorted once for all renders that draw the clusters
+        with phase('render.clusters'):
+            data['clusters'] = cluster_epics(data['epics'])
+    if 'issues' in data:
+        with phase('render.index'):
+            data['index'] = SnapshotIndex(data['issues'], data['epics'])
+        data['index'].warn_dangling()
+
+    print(f"Render {', '.join(targets)} with {jobs} jobs...")
+    render_all(targets, data, jobs)
+
+    if render_cache:
+        print(render_cache.summary())
+    print("Done!")
+
+
+# The graphs render.py can draw, each gets the data of load_render_data and the number of jobs of the render
+TARGETS: dict[str, Callable[[dict, int], None]] = {
+    'epics': lambda d, jobs: render_epics_clustered(d['epics'], d.get('clusters')),
+    'epic_relationships': lambda d, jobs: render_epic_relationships(d['epics']),
+    'issues': lambda d, jobs: render_issues_with_links(d['issues'], d['epics'], d['links_related'],
+                                                       d['links_blocking'], jobs=jobs),
+    'issues_slim': lambda d, jobs: render_issues_with_links(d['issues'], d['epics'], d['links_related'],
+                                                            d['links_blocking'], True, jobs),
+    'clustered_issues_by_epic': lambda d, jobs: render_issues_clustered_by_epic(d['issues'], d['epics'], False,
+                                                                                d.get('clusters'), d.get('index')),
+    'clustered_issues_by_epic_slim': lambda d, jobs: render_issues_clustered_by_epic(d['issues'], d['epics'], True,
+                                                                                     d.get('clusters'),
+                                                                                     d.get('index')),
+}
+ISSUE_TARGETS = {'issues', 'issues_slim', 'clustered_issues_by_epic', 'clustered_issues_by_epic_slim'}
+LINK_TARGETS = {'issues', 'issues_slim'}
+CLUSTER_TARGETS = {'epics', 'clustered_issues_by_epic', 'clustered_issues_by_epic_slim'}
+
+
+def load_render_data(snapshot: Snapshot, targets: list[str]) -> dict:
+    """Loads only the parts of the snapshot the given targets need"""
+    data = dict(epics=snapshot.load_epics())
+    if ISSUE_TARGETS.intersection(targets):
+        data['issues'] = snapshot.load_issues()
+    if LINK_TARGETS.intersection(targets):
+        data['links_related'] = snapshot.load_links(Link_Type.RELATES_TO)
+        data['links_blocking'] = snapshot.load_links(Link_Type.BLOCKS)
+    return data
+
+
+def render_all(targets: list[str], data: dict, jobs: int):
+    """Renders the targets on a pool of threads. Building a graph holds the GIL, but the layout runs in a Graphviz
+    subprocess, so the layouts of several graphs run in parallel.
+
+    A failing target doesn't stop the others, the failures are raised together at the end. The phase of a target
+    covers building its DOT source and running Graphviz, which has a phase of its own. The targets that lay out the
+    components of a graph separately use the same number of jobs for them.
+    """
+
+    def render_target(name: str) -> float:
+        with phase(f"render.{name}") as record:
+            TARGETS[name](data, jobs)
+        return record['seconds']
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(render_target, name): name for name in targets}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                print(f"** Rendered {name} in {time_string(future.result())} **")
+            except Exception as e:
+                print(f"** Rendering {name} failed: {e!r} **")
+                failed.append(name)
+
+    if failed:
+        raise RuntimeError(f"Rendering failed for {', '.join(failed)}")
+
+
+def render_graph(graph: DotWriter, name: str, format: str = 'svg'):
+    """Saves the graph's DOT source to ../renders/name and renders it to ../renders/name.format.
+
+    If the render cache already has the output of the same source, engine, format and Graphviz version, it is copied
+    from there instead of running Graphviz.
+    """
+    filename = RENDERS / name
+    output = filename.with_name(f"{name}.{format}")
+    if render_cache is None:
+        with phase(f"graphviz.{name}"):
+            graph.render(filename, format=format, view=False)
+        return
+
+    key = render_cache.key(graph.source, graph.engine, format)
+    if render_cache.fetch(key, output):
+        graph.save(filename)
+        print(f"** {name}: render cache hit **")
+        return
+    print(f"** {name}: render cache miss **")
+    with phase(f"graphviz.{name}"):
+        graph.render(filename, format=format, view=False)
+    render_cache.store(key, output)
+
+
+def render_components(graphs: list[DotWriter], name: str, jobs: int, format: str = 'svg'):
+    """Lays out the graphs in parallel and packs them into one graph, which is rendered to ../renders/name.format.
+
+    Each graph is laid out by its own engine into a DOT file with positions, gvpack arranges the laid out graphs next
+    to each other and neato renders the result with the given positions. The sources of all graphs are saved to
+    ../renders/name. The render cache is used like in render_graph.
+    """
+    filename = RENDERS / name
+    output = filename.with_name(f"{name}.{format}")
+    source = "".join(graph.source for graph in graphs)
+    filename.write_text(source)
+
+    key = render_cache.key(source, f"{graphs[0].engine}+gvpack", format) if render_cache else None
+    if key and render_cache.fetch(key, output):
+        print(f"** {name}: render cache hit **")
+        return
+    if key:
+        print(f"** {name}: render cache miss **")
 
-    Path("../renders").mkdir(parents=True, exist_ok=True)
+    start = time.time()
+    with phase(f"graphviz.{name}.layout"), ThreadPoolExecutor(max_workers=jobs) as executor:
+        laid_out = list(executor.map(lambda graph: graph.pipe(format='dot'), graphs))
+    with phase(f"graphviz.{name}.pack"):
+        packed = subprocess.run(['gvpack'], input=b"".join(laid_out), capture_output=True, check=True).stdout
+        subprocess.run(['neato', '-s', '-n2', f"-T{format}", '-o', str(output)], input=packed, check=True)
+    print(f"** {name}: laid out {len(graphs)} parts in {time_string(time.time() - start)} **")
+
+    if key:
+        render_cache.store(key, output)
+
+
+class ClusterMatcher:
+    """Finds the cluster of an epic with the patterns of the clusters in the config.
+
+    A label matches every cluster whose pattern is part of it. If several clusters match, the last matching label of
+    the epic decides, and of the clusters matching that label the last one in the config. The cluster of each label is
+    only looked up once.
+    """
+
+    def __init__(self, clusters: list[dict]):
+        self.ids = [c['id'] for c in reversed(clusters)]
+        self.patterns = [c['pattern'] for c in reversed(clusters)]
+        # one search finds out if a label contains any pattern, most labels don't
+        self.any_pattern = re.compile('|'.join(re.escape(p) for p in self.patterns)) if clusters else None
+        self.label_clusters: dict[str, Optional[int]] = {}
+
+    def label_cluster(self, label: str) -> Optional[int]:
+        """Returns the id of the cluster of the label, or None if no pattern is part of it"""
+        try:
+            return self.label_clusters[label]
+        except KeyError:
+            pass
+        cluster = None
+        if self.any_pattern and self.any_pattern.search(label):
+            cluster = next(c_id for c_id, pattern in zip(self.ids, self.patterns) if pattern in label)
+        self.label_clusters[label] = cluster
+        return cluster
 
-    # print("Generate epic overview...")
-    # render_epics_clustered(epics)
+    def epic_cluster(self, epic: Epic) -> Optional[int]:
+        """Returns the id of the cluster of the epic, or None if none of its labels matches"""
+        for label in reversed(epic.labels):
+            cluster = self.label_cluster(label)
+            if cluster is not None:
+                return cluster
+        return None
 
-    print("Generate epic relationship overview...")
-    render_epic_relationships(epics)
 
-    # print("Generate issue overview, clustered by epics...")
-    # render_issues_clustered_by_epic(issues, epics)
-    # render_issues_clustered_by_epic(issues, epics, True)
+cluster_matcher = ClusterMatcher(config['clusters'])
 
-    # print("Generate issue overview...")
-    # render_issues_with_links(issues, epics, links_related, links_blocking)
-    # render_issues_with_links(issues, epics, links_related, links_blocking, True)
+EpicClusters = tuple[dict[int, list[Epic]], list[Epic]]
 
-    print("Done!")
 
+def cluster_epics(epics: dict[int, Epic]) -> EpicClusters:
+    """Sorts the epics into the clusters of the config, see ClusterMatcher.
 
-def cluster_epics(epics: dict[int, Epic]) -> (dict[int, [Epic]], [Epic]):
-    # construct empty clusters
-    clusters: dict[int, [Epic]] = {c['id']: [] for c in config['clusters']}
-    epics_without_cluster: [Epic] = []
+    Returns - The epics of each cluster by cluster id and the epics without a cluster
+    """
+    clusters: dict[int, list[Epic]] = {c['id']: [] for c in config['clusters']}
+    epics_without_cluster: list[Epic] = []
 
-    # sort epics in clusters
     for epic in epics.values():
-        # determine the cluster
-        labels = epic.labels
-        cluster = None
-        for l in labels:
-            for c in config['clusters']:
-                pattern = c['pattern']
-                if pattern in l:
-                    cluster = c['id']
+        cluster = cluster_matcher.epic_cluster(epic)
         if cluster:
-            clusters.update({cluster: clusters.get(cluster) + [epic]})
+            clusters[cluster].append(epic)
         else:
             epics_without_cluster.append(epic)
 
@@ -78,184 +256,272 @@ def cluster_epics(epics: dict[int, Epic]) -> (dict[int, [Epic]], [Epic]):
 
 
 def render_issues_with_links(issues: dict[int, Issue], epics: dict[int, Epic], list_related: RelatedList,
-                             list_blocks: BlockList, exclude_closed_issues=False):
-    """Render issues.svg: all issues with their epics and dependencies between the issues"""
-    graph_issues = graphviz.Digraph(engine='neato',
-                                    graph_attr=dict(
-                                        # overlap='vpsc',
-                                        # overlap_scaling='-20',
-                                        # overlap_shrink='false',
-                                        sep='+15',
-                                        # scale='5',
-                                        pack='true',
-                                        fontsize='10pt',
-                                        # ratio='5',
-                                        defaultdist='15',
-                                        overlap='prism', overlap_scaling='3', ratio='0.9'
-                                    ),
-                                    node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
-                                    edge_attr=dict(weight=weight_relations, len='0.2', dir='none'))
-
-    # render all epics first
-    for epic in epics.values():
-        add_epic(epic, graph_issues)
-
-    color = ''
-
-    # Issues einfügen
-    for issue in issues.values():
-        if issue.status == Status.CLOSED:
-            fillcolor = 'ivory1'
-            style = 'filled'
-        else:
-            fillcolor = color
-            if issue.has_iteration:
+                             list_blocks: BlockList, exclude_closed_issues=False, jobs: int = None):
+    """Render issues.svg: all issues with their epics and dependencies between the issues
+
+    With render.split_components in the config, the connected components of the graph are laid out separately and
+    packed into one graph afterwards, see render_components.
+
+    Arguments:
+        jobs: Optional number of components laid out in parallel. [Default=render.jobs of the config]
+    """
+    name = 'issues_slim' if exclude_closed_issues else 'issues'
+    render_config = config.get('render', {})
+    batches = []
+    if render_config.get('split_components', False):
+        batches = batch_components(split_issue_graph(issues, epics, list_related, list_blocks),
+                                   render_config.get('component_batch_size', 200))
+
+    if len(batches) > 1:
+        graphs = [build_issue_graph(*batch, exclude_closed_issues) for batch in batches]
+        render_components(graphs, name, jobs or render_config.get('jobs', 4))
+    else:
+        render_graph(build_issue_graph(issues, epics, list_related, list_blocks, exclude_closed_issues,
+                                       RENDERS / name), name)
+
+
+def build_issue_graph(issues: dict[int, Issue], epics: dict[int, Epic], list_related: RelatedList,
+                      list_blocks: BlockList, exclude_closed_issues=False, filename=None) -> DotWriter:
+    """Builds the graph of render_issues_with_links, in memory or written to filename"""
+    with DotWriter(filename, engine='neato',
+                   graph_attr=dict(
+                       # overlap='vpsc',
+                       # overlap_scaling='-20',
+                       # overlap_shrink='false',
+                       sep='+15',
+                       # scale='5',
+                       pack='true',
+                       fontsize='10pt',
+                       # ratio='5',
+                       defaultdist='15',
+                       overlap='prism', overlap_scaling='3', ratio='0.9'
+                   ),
+                   node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
+                   edge_attr=dict(weight=weight_relations, len='0.2', dir='none')) as graph_issues:
+        # render all epics first
+        for epic in epics.values():
+            add_epic(epic, graph_issues)
+
+        color = ''
+
+        # Issues einfügen
+        for issue in issues.values():
+            if issue.status == Status.CLOSED:
+                fillcolor = 'ivory1'
                 style = 'filled'
             else:
-                style = 'filled,bold'
+                fillcolor = color
+                if issue.has_iteration:
+                    style = 'filled'
+                else:
+                    style = 'filled,bold'
 
-        if not (issue.status == Status.CLOSED and exclude_closed_issues):
-            add_issue(issue, graph_issues, fillcolor, style)
-        else:
-            add_issue(issue, graph_issues, fillcolor, style, True)
+            if not (issue.status == Status.CLOSED and exclude_closed_issues):
+                add_issue(issue, graph_issues, fillcolor, style)
+            else:
+                add_issue(issue, graph_issues, fillcolor, style, True)
 
-        if not issue.epic_id and issue.has_no_links:
-            graph_issues.edge(f"{issue.uid}",
-                              f"Kein Link oder Epic",
-                              style='invis', )
+            if not issue.epic_id and issue.has_no_links:
+                graph_issues.edge(f"{issue.uid}",
+                                  NO_LINK_NODE,
+                                  style='invis', )
 
-    for link in list_related:
-        graph_issues.edge(f"{link.source.uid}",
-                          f"{link.target.uid}")
+        # links to issues outside of the configured projects are left out, on either end
+        for link in list_related:
+            if link_within(link, issues):
+                graph_issues.edge(f"{link.source_uid}",
+                                  f"{link.target_uid}")
 
-    for link in list_blocks:
-        graph_issues.edge(f"{link.source.uid}",
-                          f"{link.target.uid}", dir='backward')
+        for link in list_blocks:
+            if link_within(link, issues):
+                graph_issues.edge(f"{link.source_uid}",
+                                  f"{link.target_uid}", dir='backward')
 
-    if exclude_closed_issues:
-        graph_issues.render('../renders/issues_slim', format='svg', view=False)
-    else:
-        graph_issues.render('../renders/issues', format='svg', view=False)
+        return graph_issues
+
+
+def link_within(link: Link, issues: dict[int, Issue]) -> bool:
+    """Returns whether both issues of the link are drawn. An is_blocked_by report turns into a link whose source is
+    the blocking issue, which may belong to a project that is not configured."""
+    return link.source_uid in issues and link.target_uid in issues
+
+
+IssueGraphPart = tuple[dict[int, Issue], dict[int, Epic], RelatedList, BlockList]
+
+
+def split_issue_graph(issues: dict[int, Issue], epics: dict[int, Epic], list_related: RelatedList,
+                      list_blocks: BlockList) -> list[IssueGraphPart]:
+    """Splits the issues, epics and links into the connected components of the graph build_issue_graph draws of them.
+    The nodes are joined along the edges in a DisjointSet, so this takes linear time.
+
+    Returns - the issues, epics and links of each component, in the order of their first epic or issue
+    """
+    node_ids: dict[str, int] = {}  # the DOT name of every node -> its number in the DisjointSet
+    edges: list[tuple[str, str]] = []
+    for epic in epics.values():
+        node_ids.setdefault(f"{epic.uid}", len(node_ids))
+    for issue in issues.values():
+        node_ids.setdefault(f"{issue.uid}", len(node_ids))
+        if issue.epic_id:
+            edges.append((f"{issue.uid}", f"{issue.epic_id}"))
+        elif issue.has_no_links:
+            edges.append((f"{issue.uid}", NO_LINK_NODE))
+    edges.extend((f"{link.source_uid}", f"{link.target_uid}") for link in list_related + list_blocks
+                 if link_within(link, issues))
+    for a, b in edges:
+        node_ids.setdefault(a, len(node_ids))
+        node_ids.setdefault(b, len(node_ids))
+
+    components = DisjointSet(len(node_ids))
+    for a, b in edges:
+        components.union(node_ids[a], node_ids[b])
+
+    parts: dict[int, IssueGraphPart] = {}
+
+    def part(name: str) -> IssueGraphPart:
+        return parts.setdefault(components.find(node_ids[name]), ({}, {}, [], []))
+
+    for epic in epics.values():
+        part(f"{epic.uid}")[1][epic.uid] = epic
+    for issue in issues.values():
+        part(f"{issue.uid}")[0][issue.uid] = issue
+    for link in list_related:
+        if link_within(link, issues):
+            part(f"{link.target_uid}")[2].append(link)
+    for link in list_blocks:
+        if link_within(link, issues):
+            part(f"{link.target_uid}")[3].append(link)
+    return list(parts.values())
+
+
+def batch_components(parts: list[IssueGraphPart], batch_size: int) -> list[IssueGraphPart]:
+    """Combines small components into batches of about batch_size issues and epics, so they don't need a Graphviz
+    process each. Graphviz packs the components of a batch by itself. Components larger than batch_size stay alone.
+    """
+    batches: list[IssueGraphPart] = []
+    size = batch_size
+    for issues, epics, list_related, list_blocks in sorted(parts, key=lambda p: len(p[0]) + len(p[1]), reverse=True):
+        if size + len(issues) + len(epics) > batch_size:
+            batches.append(({}, {}, [], []))
+            size = 0
+        batches[-1][0].update(issues)
+        batches[-1][1].update(epics)
+        batches[-1][2].extend(list_related)
+        batches[-1][3].extend(list_blocks)
+        size += len(issues) + len(epics)
+    return batches
 
 
 def render_issues_clustered_by_epic(issues: dict[int, Issue], epics: dict[int, Epic],
-                                    exclude_closed_epics: bool = False):
-    graph_clusters = graphviz.Digraph(engine='fdp',
-                                      graph_attr=dict(
-                                          sep='+5',
-                                          # scale='5',
-                                          pack='true',
-                                          fontsize='10pt',
-                                          # ratio='5',
-                                          defaultdist='10',
-                                          overlap='prism', overlap_scaling='3', ratio='0.9',
-                                          compound='true'
-                                      ),
-                                      node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
-                                      edge_attr=dict(weight=weight_relations, len='0.2', dir='none'))
-
-    # first all issues without epics
-    with graph_clusters.subgraph(name=f"cluster_no_epic") as no_epic:
-        no_epic.attr(label='No epic')
-        for project in config['projects']:
-            with no_epic.subgraph(name=f"cluster_no_epic{project['name']}") as d:
-                for uid, issue in issues.items():
-                    d.attr(label=project['name'].capitalize())
+                                    exclude_closed_epics: bool = False, epic_clusters: EpicClusters = None,
+                                    index: SnapshotIndex = None):
+    index = index or SnapshotIndex(issues, epics)
+    name = 'clustered_issues_by_epic_slim' if exclude_closed_epics else 'clustered_issues_by_epic'
+    with DotWriter(RENDERS / name, engine='fdp',
+                   graph_attr=dict(
+                       sep='+5',
+                       # scale='5',
+                       pack='true',
+                       fontsize='10pt',
+                       # ratio='5',
+                       defaultdist='10',
+                       overlap='prism', overlap_scaling='3', ratio='0.9',
+                       compound='true'
+                   ),
+                   node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
+                   edge_attr=dict(weight=weight_relations, len='0.2', dir='none')) as graph_clusters:
+        # first all issues without epics
+        with graph_clusters.subgraph(name=f"cluster_no_epic") as no_epic:
+            no_epic.attr(label='No epic')
+            for project in config['projects']:
+                with no_epic.subgraph(name=f"cluster_no_epic{project['name']}") as d:
+                    if issues:
+                        d.attr(label=project['name'].capitalize())
                     # add the issues that don't have an epic
-                    if not issue.epic_id and issue.project_id == project['project_no']:
+                    for issue in index.without_epic_by_project.get(project['project_no'], []):
                         add_issue(issue, d, 'lightgray')
 
-    clusters, epics_without_clusters = cluster_epics(epics)
-    cluster_info_by_id = {c['id']: c for c in config['clusters']}
+        clusters, epics_without_clusters = epic_clusters or cluster_epics(epics)
+        cluster_info_by_id = {c['id']: c for c in config['clusters']}
 
-    # now subgraphs for the clusters
-    for c_id, epics in clusters.items():
-        with graph_clusters.subgraph(name=f"cluster_{c_id}") as c:
-            c.attr(label=cluster_info_by_id[c_id]['name'],
-                   style='filled',
-                   color=cluster_info_by_id[c_id]['color'])
-            for epic in epics:
-                add_epic(epic, c)
+        # now subgraphs for the clusters
+        for c_id, epics in clusters.items():
+            with graph_clusters.subgraph(name=f"cluster_{c_id}") as c:
+                c.attr(label=cluster_info_by_id[c_id]['name'],
+                       style='filled',
+                       color=cluster_info_by_id[c_id]['color'])
+                for epic in epics:
+                    add_epic(epic, c)
 
-                # add the issues that have epics
-                if epic.issue_uids:
+                    # add the issues that have epics, the missing ones are reported by SnapshotIndex.warn_dangling
                     if not (exclude_closed_epics and epic.status == Status.CLOSED):
-                        for issue_uid in epic.issue_uids:
-                            try:
-                                issue = issues[issue_uid]
-                                add_issue(issue, c, 'white')
-                            except KeyError:
-                                print("KeyError!\n" + str(issue) + str(epic))
-
-    # and the epics without a cluster
-    with graph_clusters.subgraph(name=f"cluster_no_cluster") as no_cluster:
-        no_cluster.attr(label='No Cluster')
-        with no_cluster.subgraph(name=f"cluster_no_cluster_closed") as d:
-            d.attr(label='Closed epics')
-            for epic in epics_without_clusters:
-                if epic.status == Status.OPENED:
-                    add_epic(epic, no_cluster)
-                else:
-                    add_epic(epic, d)
+                        for issue in index.by_epic[epic.uid]:
+                            add_issue(issue, c, 'white')
+
+        # and the epics without a cluster
+        with graph_clusters.subgraph(name=f"cluster_no_cluster") as no_cluster:
+            no_cluster.attr(label='No Cluster')
+            with no_cluster.subgraph(name=f"cluster_no_cluster_closed") as d:
+                d.attr(label='Closed epics')
+                for epic in epics_without_clusters:
+                    if epic.status == Status.OPENED:
+                        add_epic(epic, no_cluster)
+                    else:
+                        add_epic(epic, d)
 
-                # as well as their issues
-                if epic.issue_uids:
+                    # as well as their issues
                     if not (exclude_closed_epics and epic.status == Status.CLOSED):
-                        for issue_uid in epic.issue_uids:
-                            add_issue(issues[issue_uid], no_cluster, 'white')
+                        for issue in index.by_epic[epic.uid]:
+                            add_issue(issue, no_cluster, 'white')
                     else:
-                        for issue_uid in epic.issue_uids:
-                            add_issue(issues[issue_uid], d, 'white')
-
-    if exclude_closed_epics:
-        graph_clusters.render('../renders/clustered_issues_by_epic_slim', format='svg', view=False)
-    else:
-        graph_clusters.render('../renders/clustered_issues_by_epic', format='svg', view=False)
-
-
-def render_epics_clustered(epics: dict[int, Epic]):
-    graph_epics = graphviz.Digraph(engine='fdp',
-                                   graph_attr=dict(
-                                       sep='+15',
-                                       # scale='5',
-                                       pack='true',
-                                       fontsize='10pt',
-                                       # ratio='5',
-                                       defaultdist='15',
-                                       overlap='prism', overlap_scaling='3', ratio='0.9'
-                                   ),
-                                   node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
-                                   edge_attr=dict(weight=weight_relations, len='0.2', dir='none'))
-
-    clusters, epics_without_cluster = cluster_epics(epics)
-
-    # render all epics by cluster
-    cluster_info_by_id = {c['id']: c for c in config['clusters']}
-    for c_id, epics in clusters.items():
-        name = cluster_info_by_id[c_id]['id']
-
-        with graph_epics.subgraph(name=f"cluster{name}") as cluster_subgraph:
-            cluster_subgraph.attr(label=cluster_info_by_id[c_id]['name'],
-                                  style='filled',
-                                  color=cluster_info_by_id[c_id]['color'])
-            for epic in epics:
-                add_epic(epic, cluster_subgraph)
-    with graph_epics.subgraph(name=f"cluster_no_cluster") as c:
-        c.attr(label="No cluster",
-               style='filled',
-               color='white')
-
-        with c.subgraph(name=f"cluster_no_cluster_closed") as d:
-            d.attr(label="  ",
+                        for issue in index.by_epic[epic.uid]:
+                            add_issue(issue, d, 'white')
+
+    render_graph(graph_clusters, name)
+
+
+def render_epics_clustered(epics: dict[int, Epic], epic_clusters: EpicClusters = None):
+    with DotWriter(RENDERS / 'epics', engine='fdp',
+                   graph_attr=dict(
+                       sep='+15',
+                       # scale='5',
+                       pack='true',
+                       fontsize='10pt',
+                       # ratio='5',
+                       defaultdist='15',
+                       overlap='prism', overlap_scaling='3', ratio='0.9'
+                   ),
+                   node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
+                   edge_attr=dict(weight=weight_relations, len='0.2', dir='none')) as graph_epics:
+        clusters, epics_without_cluster = epic_clusters or cluster_epics(epics)
+
+        # render all epics by cluster
+        cluster_info_by_id = {c['id']: c for c in config['clusters']}
+        for c_id, epics in clusters.items():
+            name = cluster_info_by_id[c_id]['id']
+
+            with graph_epics.subgraph(name=f"cluster{name}") as cluster_subgraph:
+                cluster_subgraph.attr(label=cluster_info_by_id[c_id]['name'],
+                                      style='filled',
+                                      color=cluster_info_by_id[c_id]['color'])
+                for epic in epics:
+                    add_epic(epic, cluster_subgraph)
+        with graph_epics.subgraph(name=f"cluster_no_cluster") as c:
+            c.attr(label="No cluster",
                    style='filled',
                    color='white')
-            for epic in epics_without_cluster:
-                if epic.status == Status.CLOSED:
-                    add_epic(epic, d)
-                else:
-                    add_epic(epic, c)
 
-    graph_epics.render('../renders/epics', format='svg', view=False)
+            with c.subgraph(name=f"cluster_no_cluster_closed") as d:
+                d.attr(label="  ",
+                       style='filled',
+                       color='white')
+                for epic in epics_without_cluster:
+                    if epic.status == Status.CLOSED:
+                        add_epic(epic, d)
+                    else:
+                        add_epic(epic, c)
+
+    render_graph(graph_epics, 'epics')
 
 
 def render_epic_relationships(epics: dict[int, Epic], horizontal=True):
@@ -272,90 +538,114 @@ def render_epic_relationships(epics: dict[int, Epic], horizontal=True):
      Arguments:
          horizontal - Determines whether the "trees" in the graph will grow from left to right or bottom to top.
      """
-    dot_graph = graphviz.Digraph(engine='fdp',
-                                 graph_attr=dict(
-                                     sep='+15',
-                                     # scale='5',
-                                     # pack='true',
-                                     fontsize='10pt',
-                                     # ratio='5',
-                                     defaultdist='15',
-                                     overlap='false', overlap_scaling='1',
-                                 ),
-                                 node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
-                                 edge_attr=dict(weight=weight_relations, len='0.2', dir='none'))
-
-    # Analyze epics and their relationships
-    epic_graph = EpicGraph(epics)
-    orphans: list[int] = epic_graph.get_orphans()
-    non_orphans: list[int] = [i for i in range(len(epic_graph)) if i not in orphans]
-
-    # Cluster orphaned epics separately
-    with dot_graph.subgraph(name='cluster_0') as c:
-        c.attr(style='filled', color='lightgrey')
-        c.node_attr.update(style='filled', color='white')
-        c.attr(label='Orphaned Epics')
-
-        for orphan in orphans:
-            add_epic(epic_graph.epics[orphan], c, graph_id=orphan + 1)
-
-    # Cluster all other epics
-    with dot_graph.subgraph(name='cluster_1') as c:
-        c.attr(style='filled', color='white')
-        c.node_attr.update(style='filled', color='white')
-        c.attr(label='Epics')
-
-        positions: dict[tuple[int, int]] = {}
-        height = 0
-        cumulative_root_width = 0
-        while len(positions.keys()) != len(non_orphans):
-            # This while loop builds up the graph's nodes in layers starting from the roots.
-            for i in non_orphans:
-                if epic_graph.node_heights[i] == height and height == 0:
-                    position = (cumulative_root_width, height * 2) if not horizontal \
-                        else (height * 2, cumulative_root_width)
-                    positions[i] = position
-                    add_epic(epic_graph.epics[i], c, positions[i], i + 1)
-                    # To prevent roots from being placed to close to each other the width of their tree is added.
-                    cumulative_root_width += epic_graph.tree_widths[i]
-                elif epic_graph.node_heights[i] == height:
-                    if not horizontal:
-                        position = (positions[epic_graph.node_parents[i]][0], height * 2)
-                        while position in positions.values():
-                            # If a position is taken by another node, the node will be placed next to it
-                            position = (position[0] + 1, position[1])
-                    else:
-                        position = (height * 2, positions[epic_graph.node_parents[i]][1])
-                        while position in positions.values():
-                            # If a position is taken by another node, the node will be placed next to it
-                            position = (position[0], position[1] + 1)
-                    positions[i] = position
-                    add_epic(epic_graph.epics[i], c, position, i + 1)
-            height += 1
-
-        # Adding the edges between nodes
-        added_related_edges = []
-        for i in range(len(epic_graph)):
-            for j in epic_graph.next[i]:
-                arrowhead = 'vee'
-                direction = 'backward'
-                dot_graph.edge(str(i + 1), str(j + 1), arrowhead=arrowhead, color='gray', dir=direction)
-            for j in epic_graph.includes[i]:
-                arrowhead = 'dot'
-                direction = 'backward'
-                dot_graph.edge(str(i + 1), str(j + 1), arrowhead=arrowhead, color='gray', dir=direction)
-            for j in epic_graph.related[i]:
-                if (i, j) not in added_related_edges:
+    with DotWriter(RENDERS / 'epic_relationships', engine='fdp',
+                   graph_attr=dict(
+                       sep='+15',
+                       # scale='5',
+                       # pack='true',
+                       fontsize='10pt',
+                       # ratio='5',
+                       defaultdist='15',
+                       overlap='false', overlap_scaling='1',
+                   ),
+                   node_attr=dict(shape='circle', fontsize='10pt', margin='0.02,0.02', height='0.3'),
+                   edge_attr=dict(weight=weight_relations, len='0.2', dir='none')) as dot_graph:
+        # Analyze epics and their relationships
+        with phase('epic_graph'):
+            epic_graph = EpicGraph(epics)
+        orphans: list[int] = epic_graph.get_orphans()
+        orphan_set = set(orphans)
+        non_orphans: list[int] = [i for i in range(len(epic_graph)) if i not in orphan_set]
+
+        # Cluster orphaned epics separately
+        with dot_graph.subgraph(name='cluster_0') as c:
+            c.attr(style='filled', color='lightgrey')
+            c.node_attr.update(style='filled', color='white')
+            c.attr(label='Orphaned Epics')
+
+            for orphan in orphans:
+                add_epic(epic_graph.epics[orphan], c, graph_id=orphan + 1)
+
+        # Cluster all other epics
+        with dot_graph.subgraph(name='cluster_1') as c:
+            c.attr(style='filled', color='white')
+            c.node_attr.update(style='filled', color='white')
+            c.attr(label='Epics')
+
+            positions = place_epics(epic_graph, non_orphans, horizontal)
+            for i, position in positions.items():
+                add_epic(epic_graph.epics[i], c, position, i + 1)
+
+            # Adding the edges between nodes
+            added_related_edges: set[tuple[int, int]] = set()
+            for i in range(len(epic_graph)):
+                for j in sorted(epic_graph.next[i]):
                     arrowhead = 'vee'
-                    direction = 'none'
+                    direction = 'backward'
                     dot_graph.edge(str(i + 1), str(j + 1), arrowhead=arrowhead, color='gray', dir=direction)
-                    added_related_edges.append((i, j))
-                    added_related_edges.append((j, i))
+                for j in sorted(epic_graph.includes[i]):
+                    arrowhead = 'dot'
+                    direction = 'backward'
+                    dot_graph.edge(str(i + 1), str(j + 1), arrowhead=arrowhead, color='gray', dir=direction)
+                for j in sorted(epic_graph.related[i]):
+                    if (i, j) not in added_related_edges:
+                        arrowhead = 'vee'
+                        direction = 'none'
+                        dot_graph.edge(str(i + 1), str(j + 1), arrowhead=arrowhead, color='gray', dir=direction)
+                        added_related_edges.add((i, j))
+                        added_related_edges.add((j, i))
+
+    render_graph(dot_graph, 'epic_relationships')
+
+
+def place_epics(epic_graph: EpicGraph, nodes: list[int], horizontal=True) -> dict[int, tuple[int, int]]:
+    """Places the given nodes of the graph in layers by their height, starting with the roots.
 
-    dot_graph.render('../renders/epic_relationships', format='svg', view=False)
+    The roots are placed next to each other, with space for the width of their trees in between. Every other node
+    starts at its parent's position in the next layer and is moved further along the layer until it finds a free spot.
 
+    Arguments:
+        horizontal - Determines whether the layers are columns that grow to the right or rows that grow upwards.
 
-def add_epic(epic: Epic, dot: graphviz.Graph, pos: tuple[int, int] = None, graph_id=None):
+    Returns - the position of every node, in the order they were placed
+    """
+    layers: dict[int, list[int]] = {}
+    for i in nodes:
+        layers.setdefault(epic_graph.node_heights[i], []).append(i)
+
+    offsets: dict[int, int] = {}  # The position of each node along its layer
+    positions: dict[int, tuple[int, int]] = {}
+    for height in sorted(layers):
+        taken: dict[int, int] = {}  # Points from a taken offset of this layer to an offset after it
+        cumulative_root_width = 0
+        for i in layers[height]:
+            if height == 0:
+                offset = cumulative_root_width
+                # To prevent roots from being placed to close to each other the width of their tree is added.
+                cumulative_root_width += epic_graph.tree_widths[i]
+            else:
+                # If a position is taken by another node, the node will be placed next to it
+                offset = find_free_offset(taken, offsets[epic_graph.node_parents[i]])
+                taken[offset] = offset + 1
+            offsets[i] = offset
+            positions[i] = (offset, height * 2) if not horizontal else (height * 2, offset)
+    return positions
+
+
+def find_free_offset(taken: dict[int, int], offset: int) -> int:
+    """Follows the taken offsets from the given one to the next free offset. The followed pointers are shortened to
+    point at it, so crowded layers are not walked through again for every node.
+    """
+    path = []
+    while offset in taken:
+        path.append(offset)
+        offset = taken[offset]
+    for k in path:
+        taken[k] = offset
+    return offset
+
+
+def add_epic(epic: Epic, dot: DotWriter, pos: tuple[int, int] = None, graph_id=None):
     fillcolor = 'lightcyan'
     fontcolor = 'black'
     if epic.status == Status.CLOSED:
@@ -363,7 +653,7 @@ def add_epic(epic: Epic, dot: graphviz.Graph, pos: tuple[int, int] = None, graph
     pos = f"{pos[0]},{pos[1]}!" if pos else ""
 
     dot.node(f"{graph_id if graph_id else epic.uid}",
-             "{} ({}/{})".format(graphviz.escape(wrap_text(epic.title, 30)), epic.count_closed,
+             "{} ({}/{})".format(label_text(epic.title, 30), epic.count_closed,
                                  epic.count_all_issues), style='filled',
              color=fontcolor,
              fontcolor=fontcolor,
@@ -371,7 +661,7 @@ def add_epic(epic: Epic, dot: graphviz.Graph, pos: tuple[int, int] = None, graph
              fillcolor=fillcolor, shape='folder', pos=pos)
 
 
-def add_issue(issue: Issue, dot: graphviz.Graph, fillcolor: str, style='filled', slim_style=False):
+def add_issue(issue: Issue, dot: DotWriter, fillcolor: str, style='filled', slim_style=False):
     color = 'black'
     shape = 'tab'
     fillcolor = "white"
@@ -394,7 +684,7 @@ def add_issue(issue: Issue, dot: graphviz.Graph, fillcolor: str, style='filled',
         dot.node(f"{issue.uid}",
                  "{}/{}\n{}".format(issue.project_id,
                                     issue.iid,
-                                    graphviz.escape(wrap_text(issue.title, 30))),
+                                    label_text(issue.title, 30)),
                  style=style,
                  color=color,
                  fontcolor=color,
@@ -431,21 +721,41 @@ def find(clusters, epic_id: int) -> str:
             return name
 
 
+@cache
+def label_text(text: str, min_length: int) -> str:
+    """The wrapped text escaped for a label. Cached, since the renders label the same epics and issues again and again
+    """
+    return graphviz.escape(wrap_text(text, min_length))
+
+
 def wrap_text(text: str, min_length: int) -> str:
+    """Replaces the first space after every min_length characters of a line with a line break"""
+    lines = []
+    start = 0
     pos = min_length
     while pos < len(text):
         whitespace = text.find(' ', pos)
-        if whitespace > 0:
-            text = text[:whitespace] + '\n' + text[whitespace + 1:]
-        else:
+        if whitespace <= 0:
             break
+        lines.append(text[start:whitespace])
+        start = whitespace + 1
         pos = whitespace + min_length
-    return text
+    lines.append(text[start:])
+    return '\n'.join(lines)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the graphs of the downloaded snapshot")
+    parser.add_argument('--only', nargs='+', choices=list(TARGETS), metavar='TARGET',
+                        help=f"only render these graphs, out of {', '.join(TARGETS)}")
+    parser.add_argument('--jobs', type=int,
+                        help="number of graphs rendered in parallel, overrides render.jobs of the config")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     start = time.time()
-    main()
+    with instrumented(args.report, args.profile):
+        main(args.only, args.jobs)
     finish = time.time()
     time_taken = finish-start
     print(f"render.py took {time_string(time_taken)}")
@@ -0,0 +1,62 @@
+import hashlib
+import shutil
+import threading
+from functools import cache
+from pathlib import Path
+
+import graphviz
+
+from src.disk_lru import DiskLRU
+
+
+@cache
+def graphviz_version() -> str:
+    """The version of the installed Graphviz, asked only once since it starts a process"""
+    return '.'.join(str(part) for part in graphviz.version())
+
+
+class RenderCache:
+    """Keeps rendered graphs on disk by the hash of everything that determines them: the DOT source, the layout
+    engine, the output format and the Graphviz version. A graph whose hash is in the cache is copied from it instead
+    of being laid out again.
+
+    Arguments:
+        directory: The directory the rendered graphs are stored in.
+        max_size: Optional maximum size of the cache in bytes. The least recently used graphs are evicted
+            once it is exceeded. [Default=100MB]
+    """
+
+    def __init__(self, directory, max_size: int = 100 * 1024 * 1024):
+        self.files = DiskLRU(directory, max_size)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, source: str, engine: str, format: str) -> str:
+        content = f"{engine}\n{format}\n{graphviz_version()}\n{source}"
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def fetch(self, key: str, output: Path) -> bool:
+        """Copies the cached graph to output
+
+        Returns - whether the graph was in the cache
+        """
+        try:
+            shutil.copyfile(self.files.path(key), output)
+            self.files.touch(key)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, output: Path):
+        """Adds a rendered graph to the cache"""
+        self.files.write(key, {'': Path(output)})
+
+    def summary(self) -> str:
+        return (f"** Render cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.files.size / 1024 / 1024:.1f}MB cached **")
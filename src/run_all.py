@@ -1,18 +1,27 @@
+import argparse
 import time
 
 import download
 import render
 from src import time_string
+from src.instrument import add_arguments, instrumented, phase
 
 if __name__ == "__main__":
-    print("Start download and parsing")
-    download_start = time.time()
-    download.main()
-    download_finished = time.time()
-    print("Start plotting")
-    render_start = time.time()
-    render.main()
-    render_finished = time.time()
+    parser = argparse.ArgumentParser(description="Download the Gitlab group and render all graphs")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args.report, args.profile):
+        print("Start download and parsing")
+        download_start = time.time()
+        with phase('download'):
+            download.main()
+        download_finished = time.time()
+        print("Start plotting")
+        render_start = time.time()
+        with phase('render'):
+            render.main()
+        render_finished = time.time()
     print("Finished")
 
     download_time_taken = download_finished - download_start
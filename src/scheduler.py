@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import gitlab
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+# Requests with a lower priority value are sent first
+PRIORITY_LIST = 0
+PRIORITY_BULK = 1
+
+
+def request_priority(request: requests.PreparedRequest) -> int:
+    """Lists of epics, issues and projects go ahead of the bulk of requests for the links of single issues"""
+    return PRIORITY_BULK if urlparse(request.url).path.endswith('/links') else PRIORITY_LIST
+
+
+def retry_after(response: requests.Response, default: float = 1.0) -> float:
+    """The seconds to wait after a response according to its Retry-After header, in seconds or as HTTP date"""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimitedAdapter(BaseAdapter):
+    """A transport adapter for requests that schedules the requests of all threads sharing a session, so they get
+    close to the throughput the server allows without running into its rate limit.
+
+    The number of requests in flight is limited and adapted like TCP's congestion window (AIMD): every successful
+    response (2xx or 3xx) raises the limit by 1/limit, so it grows by about one per round trip, and a 429 Too Many
+    Requests halves it, once per burst. Other errors leave it as it is. After a 429 no request is sent until its
+    Retry-After has passed, then it is retried. While the RateLimit-Remaining header reports the budget as almost used
+    up the limit doesn't grow, and when it is used up nothing is sent until RateLimit-Reset. Waiting requests are sent
+    in the order of their priority, see request_priority.
+
+    Arguments:
+        inner: Optional adapter that actually sends the requests. [Default=HTTPAdapter()]
+        initial_concurrency: Optional number of requests in flight at the start. [Default=8]
+        max_concurrency: Optional maximum number of requests in flight. [Default=32]
+        max_retries: Optional number of times a request is retried after a 429, then the 429 is returned. [Default=5]
+        priority: Optional function giving the priority of a request. [Default=request_priority]
+    """
+
+    def __init__(self, inner: BaseAdapter = None, initial_concurrency: int = 8, max_concurrency: int = 32,
+                 max_retries: int = 5, priority: Callable[[requests.PreparedRequest], int] = request_priority):
+        super().__init__()
+        self.inner = inner if inner is not None else HTTPAdapter(pool_maxsize=max_concurrency)
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.priority = priority
+
+        self._condition = threading.Condition()
+        self._waiting: list[tuple[int, int]] = []  # heap of the (priority, ticket) of the waiting requests
+        self._tickets = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+
+        # counters
+        self.requests: Counter[int] = Counter()  # sent requests by priority, retries included
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited = 0.0
+        self.peak_concurrency = 0
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        priority = self.priority(request)
+        attempt = 0
+        while True:
+            started = self._acquire(priority)
+            try:
+                response = self.inner.send(request, **kwargs)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+            with self._condition:
+                self._adapt(response, started)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+            response.close()
+            attempt += 1
+            with self._condition:
+                self.retries += 1
+
+    def close(self):
+        self.inner.close()
+
+    def _acquire(self, priority: int) -> float:
+        """Waits until the request may be sent and counts it as in flight
+
+        Returns - the time it is sent
+        """
+        ticket = (priority, next(self._tickets))
+        start = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._condition.wait(self._paused_until - now)
+                elif self._waiting[0] != ticket or self._in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    break
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._in_flight)
+            self.requests[priority] += 1
+            self.waited += now - start
+            # the next request in line might be allowed as well
+            self._condition.notify_all()
+        return now
+
+    def _adapt(self, response: requests.Response, started: float):
+        """Adapts the limit and the pause to a response, called with the condition held"""
+        now = time.monotonic()
+        if response.status_code == 429:
+            self.rate_limited += 1
+            # the other requests of the burst were sent before the decrease, they don't decrease it again
+            if started >= self._decreased_at:
+                self.limit = max(1.0, self.limit / 2)
+                self._decreased_at = now
+            self._paused_until = max(self._paused_until, now + retry_after(response))
+            self._condition.notify_all()
+            return
+
+        remaining = header_int(response, 'RateLimit-Remaining')
+        if remaining is not None and remaining <= self._in_flight:
+            reset = header_int(response, 'RateLimit-Reset')
+            if remaining == 0 and reset is not None:
+                self._paused_until = max(self._paused_until, now + max(0.0, reset - time.time()))
+            return
+        if not 200 <= response.status_code < 400:
+            return
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._condition.notify_all()
+
+    def counters(self) -> dict:
+        with self._condition:
+            return dict(lists=self.requests[PRIORITY_LIST], links=self.requests[PRIORITY_BULK],
+                        rate_limited=self.rate_limited, retries=self.retries, limit=self.limit,
+                        peak_concurrency=self.peak_concurrency, waited=self.waited)
+
+    def summary(self) -> str:
+        c = self.counters()
+        return (f"** Scheduler: {c['lists'] + c['links']} requests ({c['lists']} lists, {c['links']} links), "
+                f"{c['rate_limited']} rate limited, {c['retries']} retried, concurrency limit {c['limit']:.1f} "
+                f"(peak {c['peak_concurrency']}), {c['waited']:.1f}s waited in total **")
+
+
+class ScheduledGitlab(gitlab.Gitlab):
+    """A Gitlab client whose requests go through a RateLimitedAdapter. The adapter already waits for the Retry-After of
+    a 429 and retries, so python-gitlab doesn't retry once more on top of that."""
+
+    def http_request(self, *args, obey_rate_limit: bool = False, **kwargs) -> requests.Response:
+        return super().http_request(*args, obey_rate_limit=obey_rate_limit, **kwargs)
+
+
+def header_int(response: requests.Response, name: str) -> Optional[int]:
+    try:
+        return int(response.headers[name])
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from model.classes import Epic, Issue, Link, Link_Type, Status
+
+SNAPSHOT_PATH = "../snapshot/snapshot.db"
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE issues (uid INTEGER PRIMARY KEY, position INTEGER, iid INTEGER, project_id INTEGER, epic_id INTEGER,
+                     title TEXT, status INTEGER, url TEXT, has_no_links INTEGER, has_iteration INTEGER);
+CREATE TABLE epics (uid INTEGER PRIMARY KEY, position INTEGER, title TEXT, status INTEGER, labels TEXT,
+                    description TEXT, count_closed INTEGER, count_all_issues INTEGER);
+CREATE TABLE epic_issues (epic_uid INTEGER, issue_uid INTEGER);
+CREATE TABLE links (position INTEGER PRIMARY KEY, source_uid INTEGER, target_uid INTEGER, type INTEGER);
+
+CREATE INDEX issues_project ON issues (project_id);
+CREATE INDEX issues_epic ON issues (epic_id);
+CREATE INDEX issues_status ON issues (status);
+CREATE INDEX epics_status ON epics (status);
+CREATE INDEX epic_issues_epic ON epic_issues (epic_uid);
+CREATE INDEX links_source ON links (source_uid);
+CREATE INDEX links_target ON links (target_uid);
+CREATE INDEX links_type ON links (type);
+"""
+
+
+def save_snapshot(issues: dict[int, Issue], epics: dict[int, Epic], links_related: [Link], links_blocking: [Link],
+                  sync_cursor: Optional[str], path=SNAPSHOT_PATH):
+    """Writes everything downloaded into a new snapshot.
+
+    The snapshot is written next to the old one and replaces it in one step, so readers either see the complete old
+    or the complete new snapshot, even if the download dies while writing.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.unlink(missing_ok=True)
+
+    con = sqlite3.connect(tmp)
+    # no journal needed, the file only becomes visible once it is complete
+    con.execute("PRAGMA journal_mode = OFF")
+    con.execute("PRAGMA synchronous = OFF")
+    with con:
+        con.executescript(SCHEMA)
+        con.executemany("INSERT INTO meta VALUES (?, ?)",
+                        [('schema_version', str(SCHEMA_VERSION)), ('sync_cursor', sync_cursor)])
+        con.executemany("INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        ((i.uid, n, i.iid, i.project_id, i.epic_id, i.title, i.status.value, i.url,
+                          i.has_no_links, i.has_iteration) for n, i in enumerate(issues.values())))
+        con.executemany("INSERT INTO epics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        ((e.uid, n, e.title, e.status.value, json.dumps(e.labels), e.description, e.count_closed,
+                          e.count_all_issues) for n, e in enumerate(epics.values())))
+        con.executemany("INSERT INTO epic_issues VALUES (?, ?)",
+                        ((e.uid, issue_uid) for e in epics.values() for issue_uid in e.issue_uids or []))
+        con.executemany("INSERT INTO links VALUES (?, ?, ?, ?)",
+                        ((n, l.source_uid, l.target_uid, l.type.value)
+                         for n, l in enumerate(links_related + links_blocking)))
+    con.close()
+
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """Read access to a snapshot written by save_snapshot. Every load function only reads the rows it needs."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"No snapshot at {self.path}, run download.py first")
+        self.con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+
+        version = int(self.meta('schema_version'))
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"The snapshot at {self.path} has version {version} instead of {SCHEMA_VERSION}, "
+                             f"run download.py again")
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def meta(self, key: str) -> Optional[str]:
+        row = self.con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def sync_cursor(self) -> Optional[str]:
+        return self.meta('sync_cursor')
+
+    def load_issues(self, project_id: int = None, epic_id: int = None, status: Status = None) -> dict[int, Issue]:
+        """Loads the issues, optionally only the ones of a project, an epic or with a status"""
+        conditions = []
+        parameters = []
+        for column, value in [('project_id', project_id), ('epic_id', epic_id),
+                              ('status', status.value if status else None)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        issues = {}
+        rows = self.con.execute("SELECT uid, iid, project_id, epic_id, title, status, url, has_no_links, has_iteration "
+                                f"FROM issues {where} ORDER BY position", parameters)
+        for uid, iid, project_id, epic_id, title, status, url, has_no_links, has_iteration in rows:
+            issue = Issue(Status(status), uid, iid, project_id, epic_id, title, url, bool(has_iteration))
+            issue.has_no_links = bool(has_no_links)
+            issues[uid] = issue
+        return issues
+
+    def load_epics(self) -> dict[int, Epic]:
+        issue_uids: dict[int, set[int]] = {}
+        for epic_uid, issue_uid in self.con.execute("SELECT epic_uid, issue_uid FROM epic_issues"):
+            issue_uids.setdefault(epic_uid, set()).add(issue_uid)
+
+        epics = {}
+        rows = self.con.execute("SELECT uid, title, status, labels, description, count_closed, count_all_issues "
+                                "FROM epics ORDER BY position")
+        for uid, title, status, labels, description, count_closed, count_all_issues in rows:
+            epics[uid] = Epic(Status(status), uid, title, json.loads(labels), description, count_closed,
+                              count_all_issues, issue_uids.get(uid))
+        return epics
+
+    def load_links(self, link_type: Link_Type) -> [Link]:
+        """Loads the links of one type"""
+        rows = self.con.execute("SELECT source_uid, target_uid FROM links WHERE type = ? ORDER BY position",
+                                (link_type.value,))
+        return [Link(source, target, link_type) for source, target in rows]
+
+
+class SnapshotIndex:
+    """The issues of a snapshot grouped the ways the renders need them, built in one pass over the issues and the
+    issues of the epics. Works for loaded snapshots as well as for the mock data.
+
+    The issues of an epic are the ones in its issue_uids, in that order. References to issues or epics that are not
+    part of the data are collected instead of raising errors, see warn_dangling.
+    """
+
+    def __init__(self, issues: dict[int, Issue], epics: dict[int, Epic]):
+        self.without_epic_by_project: dict[int, list[Issue]] = {}
+        self.by_epic: dict[int, list[Issue]] = {}
+        self.missing_issues: list[tuple[int, int]] = []  # (epic uid, issue uid) of issues of epics that are missing
+        self.missing_epics: list[tuple[int, int]] = []  # (issue uid, epic uid) of epics of issues that are missing
+
+        for issue in issues.values():
+            if not issue.epic_id:
+                self.without_epic_by_project.setdefault(issue.project_id, []).append(issue)
+            elif issue.epic_id not in epics:
+                self.missing_epics.append((issue.uid, issue.epic_id))
+
+        for epic in epics.values():
+            epic_issues = self.by_epic[epic.uid] = []
+            for issue_uid in epic.issue_uids or []:
+                issue = issues.get(issue_uid)
+                if issue is None:
+                    self.missing_issues.append((epic.uid, issue_uid))
+                else:
+                    epic_issues.append(issue)
+
+    def warn_dangling(self, shown: int = 10):
+        """Prints the references to missing issues and epics, at most shown of each"""
+        def examples(references: list[tuple[int, int]], kind: str, other_kind: str) -> str:
+            text = ", ".join(f"{kind} {uid} of {other_kind} {other}" for other, uid in references[:shown])
+            return text + (", ..." if len(references) > shown else "")
+
+        if self.missing_issues:
+            print(f"Warning: {len(self.missing_issues)} issues of epics are not in the snapshot, they are left out: "
+                  f"{examples(self.missing_issues, 'issue', 'epic')}")
+        if self.missing_epics:
+            print(f"Warning: {len(self.missing_epics)} epics of issues are not in the snapshot: "
+                  f"{examples(self.missing_epics, 'epic', 'issue')}")
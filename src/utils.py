@@ -14,3 +14,34 @@ def dict_string(d: dict, padding=0, include_falsy=True):
 
 def time_string(time_in_seconds: float) -> str:
     return f"{int(time_in_seconds // 60)}m {int(time_in_seconds % 60)}s {int((time_in_seconds*1000)%1000)}ms"
+
+
+class DisjointSet:
+    """A union-find structure over the numbers 0 to size-1 with path halving and union by size"""
+
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+        self.sizes = [1] * size
+
+    def find(self, x: int) -> int:
+        """Returns the representative of the set containing x"""
+        while self.parents[x] != x:
+            self.parents[x] = self.parents[self.parents[x]]
+            x = self.parents[x]
+        return x
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.sizes[a] < self.sizes[b]:
+            a, b = b, a
+        self.parents[b] = a
+        self.sizes[a] += self.sizes[b]
+
+    def groups(self) -> list[list[int]]:
+        """Returns the sets as sorted lists, ordered by their smallest element"""
+        groups: dict[int, list[int]] = {}
+        for x in range(len(self.parents)):
+            groups.setdefault(self.find(x), []).append(x)
+        return list(groups.values())
@@ -0,0 +1,22 @@
+"""The modules are run from src/ and read ../settings/config.toml when they are imported. The tests run them the same
+way in a temporary directory with the example config, so they neither need nor touch a local config, snapshot or
+renders."""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_workdir = Path(tempfile.mkdtemp(prefix='gitlab-issue-visualizer-tests-'))
+(_workdir / 'settings').mkdir()
+(_workdir / 'src').mkdir()
+shutil.copyfile(ROOT / 'settings' / 'config.example.toml', _workdir / 'settings' / 'config.toml')
+os.chdir(_workdir / 'src')
+sys.path[:0] = [str(ROOT), str(ROOT / 'src')]
+
+
+def pytest_unconfigure(config):
+    os.chdir(ROOT)
+    shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,109 @@
+import json
+import re
+import shutil
+
+import graphviz
+import pytest
+
+from src.dot import DotWriter
+
+GRAPH_ATTR = dict(splines='true')
+NODE_ATTR = dict(fontsize='10')
+ATTRIBUTE_PATTERN = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|[^\s\]]+)')
+# Attributes the layout adds, they depend on the engine and not on the way the source is written
+LAYOUT_ATTRIBUTES = {'pos', 'width', 'height', 'lp', 'bb', 'head_lp', 'tail_lp', 'xlp'}
+
+
+def build(graph):
+    """A small graph like the renders draw: runs of nodes and edges with the same style, nodes mentioned by an edge
+    before they are declared, a cluster and edges with labels"""
+    graph.attr(rankdir='LR')
+    graph.edge('a', 'b', color='red')
+    for name in 'abcdef':
+        graph.node(name, label=f"Issue {name}", shape='box', style='filled', fillcolor='lightblue',
+                   URL=f"https://gitlab.example.com/{name}")
+    graph.node('g', label='Kein "Link"', shape='ellipse')
+    with graph.subgraph(name='cluster_1') as cluster:
+        cluster.attr(label='Cluster', color='grey')
+        for name in 'hijk':
+            cluster.node(name, shape='box', style='filled', fillcolor='yellow')
+    for tail, head in ['cd', 'de', 'ef', 'hi', 'ij', 'gh']:
+        graph.edge(tail, head, color='blue', arrowhead='vee')
+    graph.edge('k', 'a', label='blocks', color='red', style='bold')
+
+
+def written(min_shared_run: int = 3) -> str:
+    with DotWriter(graph_attr=GRAPH_ATTR, node_attr=NODE_ATTR, min_shared_run=min_shared_run) as graph:
+        build(graph)
+    return graph.source
+
+
+def digraph() -> str:
+    graph = graphviz.Digraph(graph_attr=GRAPH_ATTR, node_attr=NODE_ATTR)
+    build(graph)
+    return graph.source
+
+
+def resolve(source: str) -> tuple[dict, list]:
+    """The attributes every node and edge of a DOT source written by DotWriter or graphviz.Digraph ends up with, by
+    Graphviz' rules: the defaults of a block apply to the nodes and edges created in it after them.
+
+    Returns - the attributes of the nodes by their name and the sorted edges with their attributes
+    """
+    scopes = [dict(node={}, edge={})]
+    nodes: dict[str, dict] = {}
+    edges = []
+    for line in source.splitlines():
+        line = line.strip()
+        statement = line.split(' [', 1)[0]
+        attrs = {k: v.strip('"') for k, v in ATTRIBUTE_PATTERN.findall(line[len(statement):])}
+        if line.endswith('{'):
+            scopes.append({kind: dict(defaults) for kind, defaults in scopes[-1].items()})
+        elif line == '}':
+            scopes.pop()
+        elif statement in ('node', 'edge'):
+            scopes[-1][statement].update(attrs)
+        elif statement == 'graph' or '=' in statement:
+            continue
+        elif ' -> ' in statement:
+            tail, head = statement.split(' -> ')
+            for name in (tail, head):
+                nodes.setdefault(name, dict(scopes[-1]['node']))
+            edges.append((tail, head, sorted((scopes[-1]['edge'] | attrs).items())))
+        else:
+            nodes[statement] = nodes.get(statement, scopes[-1]['node']) | attrs
+    return nodes, sorted(edges)
+
+
+def test_the_source_without_shared_blocks_is_the_one_of_digraph():
+    assert written(min_shared_run=10 ** 9) == digraph()
+
+
+def test_shared_blocks_give_the_nodes_and_edges_the_attributes_of_digraph():
+    source = written()
+    # the runs were written into shared blocks
+    assert '\tnode [fillcolor=lightblue shape=box style=filled]' in source
+    assert '\tedge [arrowhead=vee color=blue]' in source
+
+    assert resolve(source) == resolve(digraph())
+
+
+def graphviz_attributes(source: str) -> tuple[dict, list]:
+    """The attributes of the nodes and edges as Graphviz parsed them, without the ones the layout adds"""
+    data = json.loads(graphviz.pipe('dot', 'json0', source.encode()))
+
+    def attributes(obj: dict) -> dict:
+        return {k: v for k, v in obj.items() if not k.startswith('_') and k not in LAYOUT_ATTRIBUTES}
+
+    # the subgraphs come first in the objects, then the nodes
+    node_objects = data.get('objects', [])[data.get('_subgraph_cnt', 0):]
+    names = {node['_gvid']: node['name'] for node in node_objects}
+    nodes = {node['name']: attributes(node) for node in node_objects}
+    edges = sorted((names[edge['tail']], names[edge['head']], sorted(attributes(edge).items()))
+                   for edge in data.get('edges', []))
+    return nodes, edges
+
+
+@pytest.mark.skipif(shutil.which('dot') is None, reason="needs the Graphviz binaries")
+def test_graphviz_parses_the_shared_blocks_like_digraph():
+    assert graphviz_attributes(written()) == graphviz_attributes(digraph())
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+import download
+from mock.compare_backends import snapshot_key
+from mock.generator import Group, generate_group
+from mock.server import Fixture, FixtureServer
+from model.classes import Link_Type
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Starts a FixtureServer for a group and points the config of download at it"""
+    servers = []
+
+    def serve(group: Group, backend: str = 'rest', **options) -> FixtureServer:
+        fixture = Fixture(group.epics, group.issues, group.links)
+        server = FixtureServer(fixture, **options).start()
+        servers.append(server)
+        monkeypatch.setitem(download.config, 'server',
+                            dict(url=server.url, private_token='fixture', group_no=fixture.group_no))
+        monkeypatch.setitem(download.config, 'projects',
+                            [dict(name=f"project-{p}", project_no=p) for p in fixture.project_ids])
+        monkeypatch.setitem(download.config, 'download',
+                            dict(download.config.get('download', {}), backend=backend, http_cache=False))
+        return server
+
+    yield serve
+    for server in servers:
+        server.stop()
+
+
+def expected_key(group: Group):
+    return snapshot_key(group.issues, group.epics,
+                        [link for link in group.links if link.type == Link_Type.RELATES_TO],
+                        [link for link in group.links if link.type == Link_Type.BLOCKS])
+
+
+@pytest.mark.parametrize('backend', ['rest', 'graphql'])
+def test_download_all_gives_the_served_group(serve, backend):
+    group = generate_group(150, seed=1, links_per_issue=2.0)
+    # an issue with more links than a page of the REST API holds
+    assert max(len(links) for links in group.issue_links().values()) > 20
+    serve(group, backend)
+
+    issues, epics, links_related, links_blocking, _ = download.download_all(download.connect())
+
+    assert snapshot_key(issues, epics, links_related, links_blocking) == expected_key(group)
+
+
+def test_download_all_retries_rate_limited_requests(serve):
+    group = generate_group(40, seed=2)
+    server = serve(group, error_rate=0.05, seed=3)
+
+    issues, epics, links_related, links_blocking, _ = download.download_all(download.connect())
+
+    assert server.request_counts['rate_limited'] > 0
+    assert snapshot_key(issues, epics, links_related, links_blocking) == expected_key(group)
+
+
+@pytest.mark.parametrize('local_epic_counts, epic_issues_outside_projects', [(True, False), (True, True),
+                                                                             (False, False)])
+def test_sync_gives_the_same_model_as_a_full_download(serve, local_epic_counts, epic_issues_outside_projects):
+    group = generate_group(150, seed=4)
+    server = serve(group)
+    download.config['download'].update(local_epic_counts=local_epic_counts,
+                                       epic_issues_outside_projects=epic_issues_outside_projects)
+    gl = download.connect()
+    issues, epics, links_related, links_blocking, _ = download.download_all(gl)
+
+    # move issues to other epics or out of them and change their state
+    fixture = server.fixture
+    epic_iids = [epic['iid'] for epic in fixture.epics]
+    for k, issue in enumerate(fixture.issues[:30]):
+        issue['epic_iid'] = epic_iids[k % len(epic_iids)] if k % 3 else None
+        issue['state'] = 'closed' if k % 2 else 'opened'
+        issue['updated_at'] = '2024-06-01T00:00:00.000Z'
+    # link two issues without links and unlink an issue from the only link of another, only one side is updated each
+    unchanged = fixture.issues[30:]
+    a, b = [issue for issue in unchanged if not fixture.links[issue['id']]][:2]
+    fixture.links[a['id']].append((b['id'], 'relates_to'))
+    fixture.links[b['id']].append((a['id'], 'relates_to'))
+    c, d = next((issue, fixture.issues_by_uid[fixture.links[issue['id']][0][0]]) for issue in unchanged
+                if issue not in (a, b) and len(fixture.links[issue['id']]) == 1
+                and len(fixture.links[fixture.links[issue['id']][0][0]]) == 1)
+    fixture.links[c['id']].clear()
+    fixture.links[d['id']].clear()
+    for issue in (a, c):
+        issue['updated_at'] = '2024-06-01T00:00:00.000Z'
+    fixture.index()
+
+    synced = download.sync(gl, issues, epics, links_related, links_blocking, '2024-03-01T00:00:00.000Z')
+    full = download.download_all(gl)
+
+    assert snapshot_key(*synced[:4]) == snapshot_key(*full[:4])
+    assert not full[0][b['id']].has_no_links and full[0][d['id']].has_no_links
+
+
+def test_sync_cursor_is_the_start_of_the_download_minus_the_margin(serve):
+    group = generate_group(20, seed=6)
+    server = serve(group)
+    download.config['download'].update(sync_margin_seconds=60)
+    gl = download.connect()
+    started = datetime.now(timezone.utc)
+    issues, epics, links_related, links_blocking, cursor = download.download_all(gl)
+
+    assert started - timedelta(seconds=61) <= datetime.fromisoformat(cursor) <= started - timedelta(seconds=59)
+    # an issue edited while the download ran, after its project was listed
+    issue = server.fixture.issues[0]
+    issue['state'] = 'closed' if issue['state'] == 'opened' else 'opened'
+    issue['updated_at'] = started.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+    synced = download.sync(gl, issues, epics, links_related, links_blocking, cursor)
+
+    assert synced[0][issue['id']].status.name.lower() == issue['state']
+
+
+def test_responses_only_carry_their_own_rate_limit_headers():
+    group = generate_group(10, seed=5)
+    with FixtureServer(Fixture(group.epics, group.issues, group.links), rate_limit=1000) as server, \
+            requests.Session() as session:
+        limited = session.get(f"{server.url}/api/v4/user")
+        # the same connection, a path that is answered before the rate limit is applied
+        not_found = session.post(f"{server.url}/api/v4/unknown", json={})
+
+    assert 'RateLimit-Remaining' in limited.headers
+    assert not_found.status_code == 404
+    assert 'RateLimit-Remaining' not in not_found.headers
@@ -0,0 +1,40 @@
+from model.classes import Epic, Status
+from src.graph import EpicGraph
+
+
+def epic_graph(relations: dict[int, list[tuple[str, int]]]) -> EpicGraph:
+    """An EpicGraph of epics whose descriptions hold the given relations, by the uid of the epic"""
+    epics = {uid: Epic(Status.OPENED, uid, f"Epic {uid}", [],
+                       '\n'.join(f"{relation} https://gitlab.example.com/groups/group/-/epics/{target}"
+                                 for relation, target in targets), 0, 0)
+             for uid, targets in relations.items()}
+    return EpicGraph(epics)
+
+
+def by_uid(graph: EpicGraph, values: dict[int, int]) -> dict[int, int]:
+    return {graph.epics[k].uid: v for k, v in values.items()}
+
+
+def test_a_shared_node_is_only_counted_for_its_parent():
+    graph = epic_graph({1: [('next', 2), ('include', 3)], 2: [('next', 4)], 3: [('next', 4)], 4: []})
+
+    assert by_uid(graph, graph.node_heights) == {1: 0, 2: 1, 3: 1, 4: 2}
+    assert by_uid(graph, graph.tree_widths) == {1: 2, 2: 1, 3: 1, 4: 1}
+
+
+def test_widths_of_a_ladder_stay_within_the_number_of_nodes():
+    # every epic is the next of the one before and included by the one before that, 2^n paths lead to the last one
+    count = 80
+    graph = epic_graph({uid: [('next', uid + 1)] * (uid < count) + [('include', uid + 2)] * (uid < count - 1)
+                        for uid in range(1, count + 1)})
+
+    assert max(graph.tree_widths.values()) <= count
+    assert by_uid(graph, graph.node_heights)[count] == count - 1
+
+
+def test_cycles_are_broken_with_a_warning(capsys):
+    graph = epic_graph({1: [('next', 2)], 2: [('next', 3)], 3: [('next', 2), ('include', 1)], 4: [('next', 4)]})
+
+    assert by_uid(graph, graph.node_heights) == {1: 0, 2: 1, 3: 2, 4: 0}
+    assert by_uid(graph, graph.tree_widths) == {1: 1, 2: 1, 3: 1, 4: 1}
+    assert "cycles, they are broken at the epics 1, 2, 4" in capsys.readouterr().out
@@ -0,0 +1,26 @@
+import requests
+
+from mock.generator import generate_group
+from mock.server import Fixture, FixtureServer
+from src.http_cache import CachingAdapter
+from src.instrument import Instrumentation
+
+
+def test_cache_hits_are_counted_apart_from_the_network(tmp_path):
+    group = generate_group(20, seed=8)
+    instrumentation = Instrumentation()
+    with FixtureServer(Fixture(group.epics, group.issues, group.links)) as server, requests.Session() as session:
+        session.mount(server.url, CachingAdapter(tmp_path))
+        instrumentation.install(session)
+        url = f"{server.url}/api/v4/groups/1/epics"
+        with instrumentation.phase('first') as first:
+            body = session.get(url).content
+        with instrumentation.phase('revalidated') as revalidated:
+            assert session.get(url).content == body
+
+    assert server.request_counts['not_modified'] == 1
+    assert (first['requests'], first['bytes'], first['cache_hits'], first['cache_bytes']) == (1, len(body), 0, 0)
+    # the revalidation went over the network, the body came from disk
+    assert (revalidated['requests'], revalidated['bytes'], revalidated['cache_hits'],
+            revalidated['cache_bytes']) == (1, 0, 1, len(body))
+    assert instrumentation.report()['cache_hits'] == 1
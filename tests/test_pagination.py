@@ -0,0 +1,32 @@
+import gitlab
+import pytest
+
+from mock.generator import generate_group
+from mock.server import Fixture, FixtureServer
+from src.pagination import list_all
+
+
+@pytest.fixture
+def fixture():
+    group = generate_group(60, seed=7)
+    return Fixture(group.epics, group.issues, group.links)
+
+
+def test_issues_are_listed_page_by_page(fixture):
+    project_id = fixture.project_ids[0]
+    with FixtureServer(fixture) as server:
+        gl = gitlab.Gitlab(server.url, 'fixture')
+        issues = [issue.id for issue in list_all(gl.projects.get(project_id, lazy=True).issues, per_page=5, prefetch=1)]
+
+    expected = [issue['id'] for issue in fixture.issues_by_project[project_id]]
+    assert issues == expected
+    assert server.request_counts['project_issues'] == -(-len(expected) // 5)
+
+
+def test_listing_errors_are_raised_in_the_caller(fixture):
+    with FixtureServer(fixture) as server:
+        gl = gitlab.Gitlab(server.url, 'fixture')
+        with pytest.raises(gitlab.exceptions.GitlabHttpError) as error:
+            list(list_all(gl.projects.get(max(fixture.project_ids) + 1, lazy=True).issues))
+
+    assert error.value.response_code == 404
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import gitlab
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+import download
+from mock.generator import generate_group
+from mock.server import Fixture, FixtureServer
+from src.scheduler import RateLimitedAdapter
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Records the paths of the requests in the order they are sent"""
+
+    def __init__(self):
+        super().__init__()
+        self.paths = []
+
+    def send(self, request, **kwargs):
+        self.paths.append(request.path_url.split('?')[0].removeprefix('/api/v4'))
+        return super().send(request, **kwargs)
+
+
+@pytest.fixture
+def fixture():
+    group = generate_group(20, seed=6)
+    return Fixture(group.epics, group.issues, group.links)
+
+
+def scheduled_session(server: FixtureServer, **options) -> tuple[requests.Session, RateLimitedAdapter]:
+    session = requests.Session()
+    adapter = RateLimitedAdapter(**options)
+    session.mount(server.url, adapter)
+    return session, adapter
+
+
+def test_a_rate_limited_burst_is_retried_until_it_succeeds(fixture):
+    with FixtureServer(fixture, rate_limit=20) as server:
+        session, adapter = scheduled_session(server, initial_concurrency=8, max_concurrency=16)
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(session.get(f"{server.url}/api/v4/user")))
+                   for _ in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert [response.status_code for response in responses] == [200] * 40
+    assert adapter.rate_limited == adapter.retries == server.request_counts['rate_limited']
+    assert adapter.peak_concurrency <= 16
+
+
+def test_429_halves_the_limit_and_pauses_until_retry_after(fixture):
+    with FixtureServer(fixture, error_rate=1.0) as server:
+        session, adapter = scheduled_session(server, initial_concurrency=8, max_retries=0)
+        start = time.monotonic()
+        first = session.get(f"{server.url}/api/v4/user")
+        assert adapter.limit == 4
+        second = session.get(f"{server.url}/api/v4/user")
+        elapsed = time.monotonic() - start
+
+    assert first.status_code == second.status_code == 429
+    # the second request waited for the Retry-After of the first, and as a new burst halved the limit again
+    assert elapsed >= 0.9
+    assert adapter.limit == 2
+
+
+def test_only_successful_responses_grow_the_limit(fixture):
+    with FixtureServer(fixture) as server:
+        session, adapter = scheduled_session(server, initial_concurrency=4)
+        for _ in range(10):
+            assert session.get(f"{server.url}/api/v4/user").status_code == 200
+        grown = adapter.limit
+        for _ in range(10):
+            assert session.get(f"{server.url}/api/v4/unknown").status_code == 404
+
+    assert grown > 4
+    assert adapter.limit == grown
+
+
+def test_lists_are_sent_before_links(fixture):
+    issue = fixture.issues[0]
+    with FixtureServer(fixture, latency=0.2) as server:
+        recorder = RecordingAdapter()
+        session, adapter = scheduled_session(server, inner=recorder, initial_concurrency=1, max_concurrency=1)
+        project = f"/projects/{issue['project_id']}"
+        paths = [f"{project}/issues", f"{project}/issues/{issue['iid']}/links", f"/groups/{fixture.group_no}/epics"]
+        threads = []
+        for path in paths:
+            # the first request keeps the only slot busy while the other two wait for it
+            threads.append(threading.Thread(target=session.get, args=(f"{server.url}/api/v4{path}",)))
+            threads[-1].start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+    assert recorder.paths == [paths[0], paths[2], paths[1]]
+
+
+def test_python_gitlab_does_not_retry_on_top_of_the_scheduler(fixture, monkeypatch):
+    with FixtureServer(fixture) as server:
+        monkeypatch.setitem(download.config, 'server', dict(url=server.url, private_token='fixture', group_no=1))
+        monkeypatch.setitem(download.config, 'download', dict(download.config.get('download', {}), http_cache=False,
+                                                              scheduler=True, max_retries=1))
+        gl = download.connect()
+        server.error_rate = 1.0
+        server.reset_counts()
+        with pytest.raises(gitlab.exceptions.GitlabHttpError) as error:
+            gl.http_get('/user')
+
+    assert error.value.response_code == 429
+    # the first request and the one retry of the scheduler
+    assert server.request_counts['rate_limited'] == 2